@@ -4,12 +4,15 @@ Puente entre Node.js y pico_connection_lib.py
 Permite comunicación bidireccional entre el simulador Node.js y el Pico real
 """
 
+import os
 import sys
 import json
 import time
 import threading
 import logging
-from pico_connection_lib import PicoConnection, find_pico_ports
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from pico_connection_lib import PicoConnection, find_pico_ports, get_port_watcher
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,6 +23,11 @@ class PicoBridge:
         self.pico_connection = None
         self.running = True
         self.output_callbacks = []
+        self.json_session = None
+        # Registro de conexiones por puerto del modo interactivo, compartido
+        # por los comandos legacy y las peticiones JSON (con el puerto en
+        # exclusiva, dos conexiones al mismo puerto no pueden coexistir)
+        self.connections = None
         
     def add_output_callback(self, callback):
         """Agregar callback para salida del Pico"""
@@ -35,20 +43,28 @@ class PicoBridge:
         try:
             ports = find_pico_ports()
             if ports:
-                print(f"✅ Encontrados {len(ports)} puerto(s) Pico:")
+                self.emit(f"✅ Encontrados {len(ports)} puerto(s) Pico:")
                 for port in ports:
-                    print(f"   - {port.device}: {port.description}")
+                    self.emit(f"   - {port.device}: {port.description}")
                 return ports
             else:
-                print("❌ No se encontraron puertos Pico")
+                self.emit("❌ No se encontraron puertos Pico")
                 return []
         except Exception as e:
-            print(f"❌ Error buscando puertos: {e}")
+            self.emit(f"❌ Error buscando puertos: {e}")
             return []
     
     def connect(self, port):
         """Conectar al Pico"""
         try:
+            # Reutilizar la conexión abierta por una petición JSON
+            connection = self.connections.open_connection(port) if self.connections else None
+            if connection:
+                self.pico_connection = connection
+                logger.info("✅ Pico ya conectado, reutilizando la conexión")
+                self.emit("PICO_CONNECTED")
+                return True
+            
             logger.info(f"Conectando a Pico en puerto {port}...")
             self.pico_connection = PicoConnection(port)
             
@@ -57,29 +73,31 @@ class PicoBridge:
             
             if self.pico_connection.connect():
                 logger.info("✅ Pico conectado exitosamente")
-                print("PICO_CONNECTED")
+                if self.connections:
+                    self.connections.add_connection(port, self.pico_connection)
+                self.emit("PICO_CONNECTED")
                 return True
             else:
                 logger.error("❌ Error conectando al Pico")
-                print("PICO_CONNECTION_FAILED")
+                self.emit("PICO_CONNECTION_FAILED")
                 return False
                 
         except Exception as e:
             logger.error(f"❌ Error conectando: {e}")
-            print(f"PICO_ERROR: {e}")
+            self.emit(f"PICO_ERROR: {e}")
             return False
     
     def handle_pico_output(self, output):
         """Manejar salida del Pico"""
         if output.strip():
             logger.info(f"Pico output: {output.strip()}")
-            print(f"PICO_OUTPUT: {output.strip()}")
+            self.emit(f"PICO_OUTPUT: {output.strip()}")
             self.notify_output(output)
     
     def execute_code(self, code):
         """Ejecutar código en el Pico"""
         if not self.pico_connection or not self.pico_connection.connected:
-            print("PICO_ERROR: No conectado al Pico")
+            self.emit("PICO_ERROR: No conectado al Pico")
             return False
             
         try:
@@ -90,15 +108,33 @@ class PicoBridge:
             
             if result:
                 logger.info(f"Resultado: {result}")
-                print(f"PICO_RESULT: {result}")
+                self.emit(f"PICO_RESULT: {result}")
             else:
-                print("PICO_EXECUTED")
+                self.emit("PICO_EXECUTED")
                 
             return True
             
         except Exception as e:
             logger.error(f"❌ Error ejecutando código: {e}")
-            print(f"PICO_ERROR: {e}")
+            self.emit(f"PICO_ERROR: {e}")
+            return False
+    
+    def sync_dir(self, local, remote="/"):
+        """Sincronizar directorio local con el Pico (solo archivos modificados)"""
+        if not self.pico_connection or not self.pico_connection.connected:
+            self.emit("PICO_ERROR: No conectado al Pico")
+            return False
+            
+        try:
+            result = self.pico_connection.sync_dir(local, remote)
+            self.emit(f"PICO_SYNCED: {len(result.uploaded)} subido(s), {len(result.unchanged)} sin cambios")
+            for name in result.failed:
+                self.emit(f"PICO_ERROR: No se pudo subir {name}")
+            return not result.failed
+            
+        except Exception as e:
+            logger.error(f"❌ Error sincronizando: {e}")
+            self.emit(f"PICO_ERROR: {e}")
             return False
     
     def interrupt_execution(self):
@@ -107,8 +143,11 @@ class PicoBridge:
             return False
             
         try:
-            self.pico_connection.interrupt_execution()
-            print("PICO_INTERRUPTED")
+            result = self.pico_connection.interrupt_execution()
+            if not result.stopped:
+                self.emit("PICO_ERROR: No se pudo interrumpir la ejecución")
+                return False
+            self.emit("PICO_INTERRUPTED")
             return True
         except Exception as e:
             logger.error(f"❌ Error interrumpiendo: {e}")
@@ -117,13 +156,53 @@ class PicoBridge:
     def disconnect(self):
         """Desconectar del Pico"""
         if self.pico_connection:
-            self.pico_connection.disconnect()
+            if not (self.connections and self.connections.disconnect(self.pico_connection.port)):
+                self.pico_connection.disconnect()
             self.pico_connection = None
-            print("PICO_DISCONNECTED")
+            self.emit("PICO_DISCONNECTED")
+    
+    def _write_stdout_line(self, line):
+        """Escribir una línea completa en stdout (una sola escritura)"""
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+    
+    def emit(self, line):
+        """
+        Escribir una línea de respuesta para Node.js
+        
+        En modo interactivo pasa por la sesión JSON, con su mismo lock: las
+        respuestas legacy, PICO_OUTPUT (desde otros hilos) y los mensajes JSON
+        nunca se intercalan a mitad de línea.
+        """
+        if self.json_session:
+            self.json_session.write_line(line)
+        else:
+            self._write_stdout_line(line)
+    
+    def _handle_json_request(self, request, send_event=None):
+        """Atender una petición JSON; "shutdown" termina el modo interactivo"""
+        if request.get("command") == "shutdown":
+            self.running = False
+            return {"ok": True}
+        
+        # Un puerto abierto con CONNECT: ya está en el registro; un
+        # "disconnect" JSON también lo cierra para los comandos legacy
+        return self.connections.handle_request(request, send_event)
     
     def run_interactive_mode(self):
-        """Modo interactivo para comunicación con Node.js"""
-        print("PICO_BRIDGE_READY")
+        """
+        Modo interactivo para comunicación con Node.js
+        
+        Acepta dos protocolos por stdin:
+        - Comandos de texto legacy (CONNECT:, EXECUTE_CODE:, ...), una línea
+        - Peticiones JSON-lines con "id" (ver JsonLinesSession), con código
+          multilínea y varias peticiones en vuelo
+        """
+        self.json_session = JsonLinesSession(self._handle_json_request, self._write_stdout_line)
+        self.connections = PicoBridgeDaemon(
+            output_callback=lambda port, output: self.json_session.send(
+                {"event": "output", "port": port, "data": output}))
+        self.emit("PICO_BRIDGE_READY")
         
         try:
             while self.running:
@@ -133,7 +212,14 @@ class PicoBridge:
                     continue
                     
                 # Parsear comandos
-                if line.startswith("CONNECT:"):
+                if line.startswith("{"):
+                    request = self.json_session.submit(line)
+                    # Sin esperar otra línea: al salir se envía la respuesta
+                    # (close espera las peticiones en vuelo)
+                    if request and request.get("command") == "shutdown":
+                        break
+                    
+                elif line.startswith("CONNECT:"):
                     port = line.split(":", 1)[1]
                     self.connect(port)
                     
@@ -141,6 +227,10 @@ class PicoBridge:
                     code = line.split(":", 1)[1]
                     self.execute_code(code)
                     
+                elif line.startswith("SYNC_DIR:"):
+                    local = line.split(":", 1)[1]
+                    self.sync_dir(local)
+                    
                 elif line == "INTERRUPT":
                     self.interrupt_execution()
                     
@@ -152,24 +242,355 @@ class PicoBridge:
                     
                 elif line == "STATUS":
                     if self.pico_connection and self.pico_connection.connected:
-                        print("PICO_STATUS: connected")
+                        self.emit("PICO_STATUS: connected")
                     else:
-                        print("PICO_STATUS: disconnected")
+                        self.emit("PICO_STATUS: disconnected")
                         
                 elif line == "QUIT":
                     self.running = False
                     break
                     
                 else:
-                    print(f"UNKNOWN_COMMAND: {line}")
+                    self.emit(f"UNKNOWN_COMMAND: {line}")
                     
         except KeyboardInterrupt:
             logger.info("Interrumpido por usuario")
         except EOFError:
             logger.info("Entrada cerrada")
         finally:
+            if self.json_session:
+                self.json_session.close()
+            self.disconnect()
+            self.connections.disconnect()
+            self.emit("PICO_BRIDGE_CLOSED")
+
+class JsonLinesSession:
+    """
+    Sesión del protocolo JSON-lines
+    
+    Cada petición es un objeto JSON en una línea con un "id" opcional. Las
+    peticiones se atienden en paralelo y cada respuesta lleva el mismo "id",
+    así el cliente puede tener varias en vuelo y emparejarlas fuera de orden.
+    El código multilínea viaja escapado dentro del JSON, sin mangling.
+    
+    Petición:  {"id": 1, "command": "execute_code", "code": "print(1)\\nprint(2)"}
+    Respuesta: {"id": 1, "ok": true, "result": "..."}
+    Evento:    {"event": "output", "port": "...", "data": "..."}
+    
+    Una petición puede emitir eventos antes de su respuesta (ej: exec_stream);
+    llevan el "id" de la petición.
+    """
+    
+    MAX_IN_FLIGHT = 8
+    
+    def __init__(self, handler, write_line):
+        """
+        Args:
+            handler: Función (petición, send_event) que devuelve la respuesta (dict)
+            write_line: Función que escribe una línea de texto en el transporte
+        """
+        self.handler = handler
+        self._write_line = write_line
+        self._write_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_IN_FLIGHT)
+    
+    def send(self, message):
+        """Escribir un mensaje completo (una línea) de forma atómica"""
+        self.write_line(json.dumps(message, ensure_ascii=False))
+    
+    def write_line(self, line):
+        """Escribir una línea de texto ya armada (ej: respuesta legacy) de forma atómica"""
+        with self._write_lock:
+            self._write_line(line)
+    
+    def submit(self, line):
+        """
+        Parsear una línea y atenderla en segundo plano
+        
+        Returns:
+            La petición parseada, o None si la línea no es JSON válido
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("se esperaba un objeto")
+        except ValueError as e:
+            self.send({"ok": False, "error": f"JSON inválido: {e}"})
+            return None
+        self._executor.submit(self._run, request)
+        return request
+    
+    def _run(self, request):
+        def send_event(event):
+            self.send(dict(event, id=request["id"]) if "id" in request else event)
+        
+        response = self.handler(request, send_event)
+        if "id" in request:
+            response = dict(response, id=request["id"])
+        self.send(response)
+    
+    def close(self):
+        """Esperar a que terminen las peticiones en vuelo"""
+        self._executor.shutdown(wait=True)
+
+
+class PicoBridgeDaemon:
+    """
+    Daemon persistente del puente
+    
+    Mantiene un PicoConnection abierto por puerto y atiende peticiones JSON
+    (una por línea) por TCP local o socket Unix. Solo la primera petición a
+    cada puerto paga la conexión; las siguientes reutilizan la sesión.
+    
+    El protocolo es el de JsonLinesSession (peticiones con "id").
+    
+    Petición:  {"id": 1, "command": "execute_code", "port": "/dev/ttyACM0", "code": "..."}
+    Respuesta: {"id": 1, "ok": true, "result": "..."}
+    
+    Con "cached": true el script se guarda en el Pico y las repeticiones
+    envían solo un stub (ver ReplProtocol._cached_script_steps).
+    """
+    
+    DEFAULT_HOST = "127.0.0.1"
+    DEFAULT_PORT = 20112
+    
+    def __init__(self, output_callback=None):
+        """
+        Args:
+            output_callback: Función (puerto, salida) para la salida asíncrona del Pico
+        """
+        self.output_callback = output_callback
+        self.connections = {}
+        self._port_locks = {}
+        self._lock = threading.Lock()
+        self.running = True
+        self._server = None
+    
+    def _resolve_port(self, port=None):
+        """Puerto explícito, la única conexión abierta o el primer Pico encontrado"""
+        if port:
+            return port
+        with self._lock:
+            open_ports = [p for p, c in self.connections.items() if c.connected]
+        if len(open_ports) == 1:
+            return open_ports[0]
+        ports = find_pico_ports(cached=True)
+        if not ports:
+            raise RuntimeError("No se encontraron puertos Pico")
+        return ports[0].device
+    
+    def _port_lock(self, port):
+        with self._lock:
+            return self._port_locks.setdefault(port, threading.Lock())
+    
+    def open_connection(self, port):
+        """Conexión ya abierta a un puerto, o None"""
+        with self._lock:
+            connection = self.connections.get(port)
+        return connection if connection and connection.connected else None
+    
+    def get_connection(self, port=None):
+        """Obtener (o abrir) la conexión persistente a un puerto"""
+        port = self._resolve_port(port)
+        connection = self.open_connection(port)
+        if connection:
+            return connection
+        
+        logger.info(f"Conectando a Pico en puerto {port}...")
+        connection = PicoConnection(port)
+        
+        def on_output(output):
+            logger.info(f"Pico output [{port}]: {output.strip()}")
+            if self.output_callback:
+                self.output_callback(port, output)
+        
+        connection.set_output_callback(on_output)
+        # Sin limpieza de procesos: el daemon no debe matar al propio puente ni al simulador
+        if not connection.connect(auto_cleanup=False):
+            raise RuntimeError(f"No se pudo conectar al puerto {port}")
+        with self._lock:
+            self.connections[port] = connection
+        return connection
+    
+    def add_connection(self, port, connection):
+        """Registrar una conexión abierta fuera del daemon (ej: CONNECT del modo interactivo)"""
+        with self._lock:
+            self.connections[port] = connection
+    
+    def disconnect(self, port=None):
+        """Cerrar una conexión (o todas si no se indica puerto)"""
+        with self._lock:
+            ports = [port] if port else list(self.connections)
+            closing = [self.connections.pop(p) for p in ports if p in self.connections]
+        for connection in closing:
+            connection.disconnect()
+        return len(closing)
+    
+    def _on_ports_changed(self, added, removed):
+        """Cerrar las conexiones de placas desenchufadas"""
+        for port in removed:
+            if self.disconnect(port.device):
+                logger.info(f"🔌 {port.device} desenchufado, conexión cerrada")
+    
+    def handle_request(self, request, send_event=None):
+        """
+        Atender una petición
+        
+        Args:
+            request: Diccionario con "command" y sus parámetros
+            send_event: Función para emitir eventos antes de la respuesta
+                (salida de exec_stream); sin ella la salida va en "result"
+            
+        Returns:
+            Diccionario de respuesta con "ok" y el resultado o "error"
+        """
+        command = request.get("command")
+        port = request.get("port")
+        
+        try:
+            if command == "find_ports":
+                ports = find_pico_ports(cached=True)
+                return {"ok": True, "ports": [
+                    {"device": p.device, "description": p.description, "manufacturer": p.manufacturer}
+                    for p in ports
+                ]}
+            
+            if command == "status":
+                with self._lock:
+                    connected = [p for p, c in self.connections.items() if c.connected]
+                return {"ok": True, "connections": connected}
+            
+            if command == "disconnect":
+                return {"ok": True, "closed": self.disconnect(port)}
+            
+            if command == "shutdown":
+                # El servidor se detiene cuando la conexión que lo pidió ya
+                # envió esta respuesta (ver Handler.finish)
+                self.running = False
+                return {"ok": True}
+            
+            if command == "exec_stream":
+                return self._exec_stream(request, send_event)
+            
+            if command not in ("connect", "execute_code", "interrupt", "sync_dir"):
+                return {"ok": False, "error": f"Comando desconocido: {command}"}
+            
+            port = self._resolve_port(port)
+            with self._port_lock(port):
+                connection = self.get_connection(port)
+                
+                if command == "connect":
+                    return {"ok": True, "port": port}
+                
+                if command == "execute_code":
+                    result = connection.execute_script_paste_mode(request.get("code", ""),
+                                                                  cached=request.get("cached", False))
+                    return {"ok": True, "port": port, "result": result}
+                
+                if command == "interrupt":
+                    result = connection.interrupt_execution(request.get("max_level", connection.STOP_SOFT_REBOOT))
+                    return {"ok": result.stopped, "port": port, "level": result.level,
+                            "seconds": round(result.seconds, 3)}
+                
+                result = connection.sync_dir(request["local"], request.get("remote", "/"))
+                return {"ok": not result.failed, "port": port, "uploaded": result.uploaded,
+                        "unchanged": result.unchanged, "failed": result.failed}
+                
+        except Exception as e:
+            logger.error(f"❌ Error atendiendo {command}: {e}")
+            return {"ok": False, "error": str(e)}
+    
+    def _exec_stream(self, request, send_event=None):
+        """
+        Ejecutar código reenviando su salida como eventos a medida que llega
+        
+        El lock del puerto solo se toma para lanzar el script: mientras se
+        reenvía la salida, otra petición al mismo puerto (ej: "interrupt" o un
+        nuevo "execute_code") puede atenderse y termina el stream.
+        """
+        port = self._resolve_port(request.get("port"))
+        with self._port_lock(port):
+            connection = self.get_connection(port)
+            stream = connection.exec_stream(request.get("code", ""), lines=request.get("lines", False))
+        
+        collected = []
+        with stream:
+            for chunk in stream:
+                if send_event:
+                    send_event({"event": "output", "port": port, "data": chunk})
+                else:
+                    collected.append(chunk)
+        
+        response = {"ok": True, "port": port, "finished": stream.finished, "error": stream.error}
+        if not send_event:
+            response["result"] = ("\n" if stream.lines else "").join(collected)
+        return response
+    
+    def _make_handler(self):
+        daemon = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def write_line(self, line):
+                self.wfile.write(line.encode('utf-8') + b"\n")
+                self.wfile.flush()
+            
+            def handle(self):
+                session = JsonLinesSession(daemon.handle_request, self.write_line)
+                try:
+                    for line in self.rfile:
+                        line = line.strip()
+                        if line:
+                            request = session.submit(line.decode('utf-8'))
+                            # Sin esperar otra línea: close envía la respuesta
+                            if request and request.get("command") == "shutdown":
+                                break
+                finally:
+                    session.close()
+            
+            def finish(self):
+                # Las respuestas ya están escritas y vaciadas: recién ahora se
+                # puede detener el servidor sin perder la de "shutdown"
+                super().finish()
+                if not daemon.running:
+                    daemon.shutdown()
+        
+        return Handler
+    
+    def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        """Atender peticiones hasta recibir "shutdown" o Ctrl+C"""
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._server = socketserver.ThreadingUnixStreamServer(socket_path, self._make_handler())
+            address = socket_path
+        else:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            self._server = socketserver.ThreadingTCPServer((host, port), self._make_handler())
+            address = f"{host}:{port}"
+        self._server.daemon_threads = True
+        
+        # Tabla de puertos en caché: find_ports no enumera en cada petición
+        unsubscribe = get_port_watcher().subscribe(self._on_ports_changed)
+        
+        logger.info(f"🚀 Daemon del puente escuchando en {address}")
+        print(f"PICO_BRIDGE_DAEMON_READY: {address}", flush=True)
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Interrumpido por usuario")
+        finally:
+            unsubscribe()
+            self._server.server_close()
             self.disconnect()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
             print("PICO_BRIDGE_CLOSED")
+    
+    def shutdown(self):
+        """Detener el servidor (desde otro hilo)"""
+        self.running = False
+        if self._server:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
 
 def main():
     """Función principal"""
@@ -204,16 +625,42 @@ def main():
                 print("PICO_ERROR: No se pudo conectar al Pico")
                 sys.exit(1)
             
+        elif command == "--sync-dir" and len(sys.argv) > 2:
+            local = sys.argv[2]
+            remote = sys.argv[3] if len(sys.argv) > 3 else "/"
+            bridge = PicoBridge()
+            
+            # Buscar puerto Pico automáticamente
+            ports = bridge.find_ports()
+            if not ports:
+                print("PICO_ERROR: No se encontraron puertos Pico")
+                sys.exit(1)
+                
+            if not (bridge.connect(ports[0].device) and bridge.sync_dir(local, remote)):
+                sys.exit(1)
+            
         elif command == "--interactive":
             bridge = PicoBridge()
             bridge.run_interactive_mode()
             
+        elif command == "--daemon":
+            # --daemon [PUERTO_TCP | --socket RUTA]
+            daemon = PicoBridgeDaemon()
+            if len(sys.argv) > 3 and sys.argv[2] == "--socket":
+                daemon.serve(socket_path=sys.argv[3])
+            elif len(sys.argv) > 2:
+                daemon.serve(port=int(sys.argv[2]))
+            else:
+                daemon.serve()
+            
         else:
             print("Comandos disponibles:")
             print("  --find-ports     : Buscar puertos Pico")
             print("  --connect PORT   : Conectar a puerto específico")
             print("  --execute-code   : Ejecutar código desde stdin")
+            print("  --sync-dir DIR [REMOTE] : Subir solo archivos modificados")
             print("  --interactive    : Modo interactivo")
+            print("  --daemon [PORT | --socket PATH] : Daemon persistente (JSON por línea)")
     else:
         # Modo por defecto: buscar puertos y mostrar ayuda
         bridge = PicoBridge()
@@ -46,12 +46,44 @@ import serial
 import serial.tools.list_ports
 import time
 import threading
+import asyncio
 import logging
 import subprocess
 import os
 import signal
-from typing import Optional, List, Dict, Tuple, Callable
+import errno
+import select
+import ctypes
+import codecs
+import queue
+import ast
+import io
+import tokenize
+import keyword
+import itertools
+import string
+import builtins
+import tempfile
+import re
+import base64
+import zlib
+import json
+import hashlib
+from typing import Optional, List, Dict, Tuple, Callable, Union
 from dataclasses import dataclass
+from collections import deque, OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import pyudev  # Opcional: eventos hotplug de udev
+except ImportError:
+    pyudev = None
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -63,113 +95,3333 @@ class PicoPort:
     device: str
     description: str
     manufacturer: str
+    vid: Optional[int] = None
+    pid: Optional[int] = None
+    serial_number: Optional[str] = None
+    board: str = ""
+
+@dataclass
+class PortHolder:
+    """Proceso que tiene abierto un puerto serial"""
+    pid: int
+    name: str
+    cmdline: str
+
+@dataclass
+class TransferStats:
+    """Estadísticas de una transferencia de archivo"""
+    filename: str
+    size: int
+    seconds: float
+    blocks: int
+    retries: int = 0
+    wire_size: int = 0             # Bytes transferidos por el cable (menos que size si se comprimió)
+    
+    @property
+    def bytes_per_second(self) -> float:
+        """Throughput de la transferencia en bytes por segundo"""
+        return self.size / self.seconds if self.seconds > 0 else 0.0
+
+@dataclass
+class MinifyResult:
+    """Resultado de minify_source"""
+    source: str
+    original_size: int
+    minified_size: int
+    
+    @property
+    def saved(self) -> int:
+        """Bytes ahorrados"""
+        return self.original_size - self.minified_size
+
+@dataclass
+class InterruptResult:
+    """Resultado de detener un script (ver PicoConnection.interrupt_execution)"""
+    stopped: bool                  # El REPL volvió a responder
+    level: str                     # Nivel que hizo falta (ReplProtocol.STOP_LEVELS) o "" si no se logró
+    seconds: float
+    attempts: int                  # Comandos de interrupción enviados
+
+@dataclass
+class SyncResult:
+    """Resultado de sincronizar un directorio local con el Pico"""
+    uploaded: List[str]
+    unchanged: List[str]
+    failed: List[str]
+    seconds: float
+
+@dataclass
+class FleetResult:
+    """Resultado de una operación de PicoFleet en una placa"""
+    port: str
+    ok: bool
+    result: object = None
+    error: Optional[str] = None
+    connect_seconds: float = 0.0
+    seconds: float = 0.0
+
+@dataclass
+class BufferStats:
+    """Métricas del buffer de recepción"""
+    capacity: int
+    used: int
+    high_water: int                # Máximo ocupado desde que se creó el buffer
+    dropped: int                   # Bytes descartados por desborde (drop_oldest)
+    spilled: int                   # Bytes movidos a disco por desborde (spill)
+    blocked_seconds: float         # Tiempo que el lector esperó espacio (block)
+
+# Minificación de scripts (ver minify_source)
+_MINIFY_CACHE_SIZE = 256
+_minify_cache: "OrderedDict[Tuple[str, bool], MinifyResult]" = OrderedDict()
+_minify_lock = threading.Lock()
+# Si una función usa alguno de estos, sus nombres locales no se acortan
+_MINIFY_DYNAMIC_NAMES = {"locals", "vars", "eval", "exec", "dir"}
+
+def _docstring_nodes(tree: ast.AST) -> Dict[Tuple[int, int], bool]:
+    """Posición (línea, columna) de cada docstring -> True si es la única sentencia del bloque"""
+    docstrings = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if (body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant)
+                    and isinstance(body[0].value.value, str)):
+                docstrings[(body[0].lineno, body[0].col_offset)] = len(body) == 1
+    return docstrings
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    """Quitar docstrings del árbol (un bloque que solo tenía docstring queda con pass)"""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if (body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant)
+                    and isinstance(body[0].value.value, str)):
+                node.body = body[1:] or ([ast.Pass()] if not isinstance(node, ast.Module) else [])
+    return tree
+
+def _local_renames(tree: ast.AST, taken: set) -> List[Tuple[Tuple[int, int], Tuple[int, int], Dict[str, str]]]:
+    """
+    Nombres locales de cada función que se pueden acortar sin cambiar la semántica
+    
+    Solo variables asignadas dentro de la función que no son parámetros, ni
+    global/nonlocal, ni importadas, ni aparecen en un scope anidado o en un
+    f-string. Devuelve (inicio, fin, {nombre: nombre corto}) por cuerpo de función.
+    """
+    def short_names():
+        for length in range(1, 4):
+            for combo in itertools.product(string.ascii_lowercase, repeat=length):
+                name = ''.join(combo)
+                if name not in taken and not keyword.iskeyword(name):
+                    yield name
+    
+    scopes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef,
+              ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+    renames = []
+    for func in ast.walk(tree):
+        if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        stores, excluded, used = set(), set(), set()
+        args = func.args
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]:
+            if arg:
+                excluded.add(arg.arg)
+        
+        def visit(node, nested):
+            if nested or isinstance(node, ast.JoinedStr):
+                # Cualquier identificador de un scope anidado queda fuera
+                for sub in ast.walk(node):
+                    for field in ('id', 'arg', 'name', 'asname'):
+                        value = getattr(sub, field, None)
+                        if isinstance(value, str):
+                            excluded.add(value.split('.')[0])
+                    if isinstance(sub, (ast.Global, ast.Nonlocal)):
+                        excluded.update(sub.names)
+                return
+            if isinstance(node, ast.Name):
+                used.add(node.id)
+                if isinstance(node.ctx, ast.Store):
+                    stores.add(node.id)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                excluded.update(node.names)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                excluded.update((a.asname or a.name).split('.')[0] for a in node.names)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                stores.add(node.name)
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, scopes):
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                        excluded.add(child.name)
+                    visit(child, True)
+                else:
+                    visit(child, False)
+        
+        for statement in func.body:
+            visit(statement, isinstance(statement, scopes))
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                excluded.add(statement.name)
+        if used & _MINIFY_DYNAMIC_NAMES:
+            continue
+        
+        names = short_names()
+        mapping = {}
+        for name in sorted(stores - excluded):
+            short = next(names, None)
+            if short is None or len(short) >= len(name):
+                continue
+            mapping[name] = short
+        if mapping:
+            first = func.body[0]
+            renames.append(((first.lineno, first.col_offset), (func.end_lineno, func.end_col_offset), mapping))
+    return renames
+
+def minify_source(source: str, rename_locals: bool = False) -> MinifyResult:
+    """
+    Reducir el tamaño de un script sin cambiar su semántica
+    
+    🗜️ MINIFICACIÓN (tokenize + ast):
+    - Quita comentarios, docstrings y líneas en blanco
+    - Indentación de un espacio por nivel y sin espacios entre tokens
+    - rename_locals=True acorta los nombres de variables locales de funciones
+    - El resultado se verifica comparando el AST y se cachea por hash
+    
+    Los números de línea de los tracebacks dejan de coincidir con el original.
+    Si el código no es Python válido para CPython (o la verificación falla)
+    se devuelve sin cambios.
+    
+    Args:
+        source: Código Python
+        rename_locals: Acortar nombres locales
+        
+    Returns:
+        MinifyResult con el código resultante y los bytes ahorrados
+    """
+    key = (hashlib.sha256(source.encode('utf-8')).hexdigest(), rename_locals)
+    with _minify_lock:
+        if key in _minify_cache:
+            _minify_cache.move_to_end(key)
+            return _minify_cache[key]
+    
+    original_size = len(source.encode('utf-8'))
+    try:
+        tree = ast.parse(source)
+        docstrings = _docstring_nodes(tree)
+        taken = {t.string for t in tokenize.generate_tokens(io.StringIO(source).readline)
+                 if t.type == tokenize.NAME} | set(dir(builtins))
+        renames = _local_renames(tree, taken) if rename_locals else []
+        lines = source.splitlines(keepends=True)
+        
+        out = []
+        depth = 0
+        prev = None                    # Último token emitido en la línea lógica
+        bracket_depth = 0
+        line_start = True
+        skip_line = False
+        fstring_start = None
+        tokens = list(tokenize.generate_tokens(io.StringIO(source).readline))
+        for index, tok in enumerate(tokens):
+            kind, text = tok.type, tok.string
+            if fstring_start is not None:
+                # Los f-strings se copian tal cual del original
+                if kind == getattr(tokenize, 'FSTRING_START', None):
+                    fstring_start[1] += 1
+                elif kind == getattr(tokenize, 'FSTRING_END', None):
+                    fstring_start[1] -= 1
+                    if fstring_start[1] == 0:
+                        (srow, scol), _ = fstring_start
+                        erow, ecol = tok.end
+                        if srow == erow:
+                            text = lines[srow - 1][scol:ecol]
+                        else:
+                            text = lines[srow - 1][scol:] + ''.join(lines[srow:erow - 1]) + lines[erow - 1][:ecol]
+                        fstring_start = None
+                        kind = tokenize.STRING
+                if fstring_start is not None:
+                    continue
+            elif kind == getattr(tokenize, 'FSTRING_START', None):
+                fstring_start = [tok.start, 1]
+                continue
+            
+            if kind in (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING):
+                continue
+            if kind == tokenize.INDENT:
+                depth += 1
+                continue
+            if kind == tokenize.DEDENT:
+                depth -= 1
+                continue
+            if kind == tokenize.ENDMARKER:
+                break
+            if kind == tokenize.NEWLINE:
+                if prev is not None:
+                    out.append('\n')
+                prev = None
+                line_start = True
+                skip_line = False
+                continue
+            if skip_line:
+                continue
+            
+            if line_start:
+                line_start = False
+                if tok.start in docstrings and kind == tokenize.STRING:
+                    if docstrings[tok.start]:
+                        out.append(' ' * depth + 'pass')
+                        prev = (tokenize.NAME, 'pass')
+                    skip_line = True
+                    continue
+                out.append(' ' * depth)
+            
+            if kind == tokenize.NAME and renames:
+                previous = tokens[index - 1].string if index else ''
+                following = tokens[index + 1].string if index + 1 < len(tokens) else ''
+                keyword_arg = bracket_depth and following == '='
+                if previous != '.' and not keyword_arg:
+                    for start, end, mapping in renames:
+                        if start <= tok.start < end and text in mapping:
+                            text = mapping[text]
+                            break
+            
+            if kind == tokenize.OP and text in '([{':
+                bracket_depth += 1
+            elif kind == tokenize.OP and text in ')]}':
+                bracket_depth -= 1
+            
+            if prev is not None:
+                prev_kind, prev_text = prev
+                if ((prev_text[-1].isalnum() or prev_text[-1] == '_') and (text[0].isalnum() or text[0] == '_')
+                        or prev_kind == tokenize.NUMBER and text[0] == '.'):
+                    out.append(' ')
+            out.append(text)
+            prev = (kind, text)
+        
+        minified = ''.join(out)
+        # Verificación: mismo AST (sin docstrings) que el original
+        if not renames:
+            if ast.dump(_strip_docstrings(ast.parse(minified))) != ast.dump(_strip_docstrings(ast.parse(source))):
+                raise ValueError("el AST minificado no coincide")
+        else:
+            ast.parse(minified)
+    except (SyntaxError, ValueError, tokenize.TokenError, IndentationError) as e:
+        logger.debug(f"No se minificó el script: {e}")
+        minified = source
+    
+    result = MinifyResult(minified, original_size, len(minified.encode('utf-8')))
+    with _minify_lock:
+        _minify_cache[key] = result
+        while len(_minify_cache) > _MINIFY_CACHE_SIZE:
+            _minify_cache.popitem(last=False)
+    return result
+
+class ByteRing:
+    """
+    Anillo de bytes de capacidad fija, preasignado una sola vez
+    
+    Base de RxBuffer y AsyncRxBuffer (sin sincronización propia). Las copias
+    se hacen con slices de memoryview sobre el bytearray preasignado, así la
+    memoria no crece con la salida del Pico y cada byte se copia una vez al
+    entrar y otra al consumirse.
+    
+    Política de desborde (cuando llega más de lo que cabe):
+    - DROP_OLDEST: descartar lo más antiguo
+    - BLOCK: el lector espera espacio (ver RxBuffer.wait_for_space)
+    - SPILL: mover lo más antiguo a un archivo; al consumir se recupera, así
+      no se pierde nada con memoria acotada. Los marcadores solo se buscan
+      en memoria.
+    """
+    
+    DROP_OLDEST = "drop_oldest"
+    BLOCK = "block"
+    SPILL = "spill"
+    
+    def __init__(self, capacity: int = 65536, overflow: str = DROP_OLDEST,
+                 spill_path: Optional[str] = None):
+        if overflow not in (self.DROP_OLDEST, self.BLOCK, self.SPILL):
+            raise ValueError(f"Política de desborde desconocida: {overflow}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._size = 0
+        self._spill = None             # Archivo con los bytes más antiguos (SPILL)
+        self._spill_pending = 0
+        self._spill_read = 0
+        self._discarded = 0            # Bytes que salieron del anillo sin consumirse
+        self._high_water = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._blocked_seconds = 0.0
+    
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+    
+    def _available(self) -> int:
+        return self._spill_pending + self._size
+    
+    def _segments(self, offset: int, count: int):
+        """Hasta dos memoryviews con `count` bytes desde `offset` (relativo al inicio)"""
+        begin = (self._start + offset) % self.capacity
+        first = min(count, self.capacity - begin)
+        return self._view[begin:begin + first], self._view[:count - first]
+    
+    def _advance(self, count: int):
+        self._start = (self._start + count) % self.capacity
+        self._size -= count
+        if self._size == 0:
+            self._start = 0
+    
+    def _spill_write(self, chunks):
+        """Agregar bytes al final del archivo de desborde (se crea al primer uso)"""
+        if self._spill is None:
+            self._spill = (open(self.spill_path, 'w+b') if self.spill_path
+                           else tempfile.TemporaryFile())
+            self._spill_read = 0
+        self._spill.seek(0, os.SEEK_END)
+        for chunk in chunks:
+            self._spill.write(chunk)
+            self._spill_pending += len(chunk)
+            self._spilled += len(chunk)
+    
+    def _make_room(self, count: int):
+        """Liberar `count` bytes del anillo según la política (DROP_OLDEST o SPILL)"""
+        if self.overflow == self.SPILL:
+            self._spill_write(self._segments(0, count))
+        else:
+            self._dropped += count
+        self._advance(count)
+        self._discarded += count
+    
+    def _write(self, data: bytes):
+        """Agregar datos aplicando la política de desborde"""
+        view = memoryview(data)
+        if len(view) > self.capacity:
+            # Solo cabe la cola: el anillo entero y lo anterior se desbordan
+            head = view[:len(view) - self.capacity]
+            self._make_room(self._size)
+            if self.overflow == self.SPILL:
+                self._spill_write((head,))
+            else:
+                self._dropped += len(head)
+            self._discarded += len(head)
+            view = view[len(head):]
+        
+        if len(view) > self.free:
+            self._make_room(len(view) - self.free)
+        
+        end = (self._start + self._size) % self.capacity
+        first = min(len(view), self.capacity - end)
+        self._buf[end:end + first] = view[:first]
+        self._buf[:len(view) - first] = view[first:]
+        self._size += len(view)
+        self._high_water = max(self._high_water, self._size)
+    
+    def _take(self, count: int) -> bytes:
+        """Consumir `count` bytes (primero los derramados a disco, luego el anillo)"""
+        parts = []
+        if self._spill_pending:
+            from_spill = min(count, self._spill_pending)
+            self._spill.seek(self._spill_read)
+            parts.append(self._spill.read(from_spill))
+            self._spill_read += from_spill
+            self._spill_pending -= from_spill
+            count -= from_spill
+            if not self._spill_pending:
+                self._spill.close()
+                self._spill = None
+        count = min(count, self._size)
+        parts.extend(self._segments(0, count))
+        self._advance(count)
+        return b"".join(parts)
+    
+    def _find_end(self, markers: Tuple[bytes, ...], offset: int = 0) -> int:
+        """
+        Final del primer marcador en memoria buscando desde offset, o -1
+        
+        Los llamadores pasan como offset lo ya revisado menos el largo del
+        marcador más largo, así cada byte se revisa una vez (costo lineal).
+        El resultado es relativo al inicio del anillo.
+        """
+        first, second = self._segments(0, self._size)
+        base = self._start
+        len1, len2 = len(first), len(second)
+        best = -1
+        for marker in markers:
+            index = -1
+            if offset < len1:
+                found = self._buf.find(marker, base + offset, base + len1)
+                if found != -1:
+                    index = found - base
+            if index == -1 and len2:
+                # Marcador partido en el borde del anillo
+                low = max(offset, len1 - len(marker) + 1)
+                if low < len1:
+                    edge = bytes(first[low:]) + bytes(second[:len(marker) - 1])
+                    found = edge.find(marker)
+                    if found != -1:
+                        index = low + found
+                if index == -1:
+                    found = self._buf.find(marker, max(0, offset - len1), len2)
+                    if found != -1:
+                        index = len1 + found
+            if index != -1 and (best == -1 or index + len(marker) < best):
+                best = index + len(marker)
+        return best
+    
+    def stats(self) -> BufferStats:
+        """Métricas de uso del buffer"""
+        return BufferStats(self.capacity, self._available(), self._high_water,
+                           self._dropped, self._spilled, self._blocked_seconds)
+
+class RxBuffer(ByteRing):
+    """
+    Buffer de recepción entre el hilo lector y los métodos de comando
+    
+    El hilo lector es el único que lee del puerto serial y deposita aquí los
+    bytes; los comandos consumen exactamente hasta el marcador que esperan,
+    dejando el resto para la siguiente lectura. Memoria fija (ver ByteRing).
+    """
+    
+    def __init__(self, capacity: int = 65536, overflow: str = ByteRing.DROP_OLDEST,
+                 spill_path: Optional[str] = None):
+        super().__init__(capacity, overflow, spill_path)
+        self._cond = threading.Condition()
+    
+    def feed(self, data: bytes):
+        """Agregar datos recibidos (si no caben se aplica la política de desborde)"""
+        with self._cond:
+            self._write(data)
+            self._cond.notify_all()
+    
+    def wait_for_space(self, count: int, timeout: Optional[float] = None) -> bool:
+        """
+        Esperar a que quepan `count` bytes (política BLOCK)
+        
+        El lector la llama sin tener tomado ningún lock de la conexión: así
+        deja de leer el puerto y el control de flujo USB frena al Pico.
+        """
+        count = min(count, self.capacity)
+        start_time = time.monotonic()
+        with self._cond:
+            ok = self._cond.wait_for(lambda: self.free >= count, timeout)
+        self._blocked_seconds += time.monotonic() - start_time
+        return ok
+    
+    def available(self) -> int:
+        """Bytes pendientes de consumir"""
+        with self._cond:
+            return self._available()
+    
+    def clear(self) -> bytes:
+        """Descartar (y devolver) todo lo pendiente"""
+        with self._cond:
+            data = self._take(self._available())
+            self._cond.notify_all()
+            return data
+    
+    def read_until(self, markers: Tuple[bytes, ...], timeout: float) -> Tuple[bytes, bool]:
+        """
+        Consumir hasta el final del primer marcador encontrado
+        
+        Con la política BLOCK lo revisado sin marcador se pasa al resultado a
+        medida que llega, para liberar espacio al lector (si no, una respuesta
+        más grande que el anillo nunca llegaría a su marcador).
+        
+        Returns:
+            Tupla (datos consumidos, True si se encontró un marcador). Si no se
+            encuentra antes del deadline se consume todo lo pendiente.
+        """
+        deadline = time.monotonic() + timeout
+        overlap = max(len(m) for m in markers) - 1
+        parts = []
+        with self._cond:
+            searched = 0
+            discarded = self._discarded
+            while True:
+                # Lo que salió del anillo mientras se esperaba ya no cuenta
+                searched = max(0, searched - (self._discarded - discarded))
+                discarded = self._discarded
+                end = self._find_end(markers, max(0, searched - overlap))
+                if end != -1:
+                    parts.append(self._take(self._spill_pending + end))
+                    self._cond.notify_all()
+                    return b"".join(parts), True
+                if self.overflow == self.BLOCK and self._size > overlap:
+                    parts.append(self._take(self._size - overlap))
+                    self._cond.notify_all()
+                searched = self._size
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    parts.append(self._take(self._available()))
+                    self._cond.notify_all()
+                    return b"".join(parts), False
+                self._cond.wait(remaining)
+    
+    def read_count(self, count: int, timeout: float) -> bytes:
+        """Consumir exactamente `count` bytes (o lo que haya al vencer el deadline)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._available() < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            data = self._take(count)
+            self._cond.notify_all()
+            return data
+    
+    def stats(self) -> BufferStats:
+        with self._cond:
+            return super().stats()
+
+class OutputStream:
+    """
+    Salida de un script en ejecución como iterador (ver PicoConnection.exec_stream)
+    
+    🚀 STREAMING CON MEMORIA ACOTADA:
+    - Entrega chunks (o líneas con lines=True) a medida que llegan
+    - Cola de max_pending chunks: si el consumidor se atrasa, el hilo lector
+      se detiene y el control de flujo USB frena al propio Pico (backpressure)
+    - cancel() interrumpe el script (Ctrl+C); la iteración termina con el
+      traceback de KeyboardInterrupt
+    - La iteración termina cuando el script termina (prompt del Pico)
+    
+    Ejemplo:
+        with pico.exec_stream(script, lines=True) as stream:
+            for line in stream:
+                print(line)
+                if 'listo' in line:
+                    stream.cancel()
+    """
+    
+    DEFAULT_MAX_PENDING = 64
+    _END = object()
+    
+    def __init__(self, framing: str, cancel: Callable[[], None], lines: bool = False,
+                 max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        Args:
+            framing: "raw" (salida EOT error EOT >) o "paste" (salida hasta >>>)
+            cancel: Función que interrumpe el script en el Pico
+            lines: Si True, iterar por líneas completas en lugar de chunks
+            max_pending: Máximo de chunks sin consumir antes de frenar al lector
+        """
+        self.framing = framing
+        self.lines = lines
+        self.finished = False          # El script terminó (llegó el prompt)
+        self.cancelled = False
+        self.error = ""                # stderr del script (solo framing "raw")
+        self._cancel = cancel
+        self._queue: queue.Queue = queue.Queue(max(1, max_pending))
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._pending = b""
+        self._phase = 0                # raw: 0 salida, 1 error, 2 esperando ">"
+        self._started = False          # paste: ya se descartó el salto de línea inicial
+        self._line = ""
+        self._closed = threading.Event()
+    
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+    
+    def feed(self, data: bytes) -> bytes:
+        """
+        Procesar bytes del Pico (lo llama el lector; puede bloquear por backpressure)
+        
+        Returns:
+            Bytes recibidos después del fin del script (no pertenecen al stream)
+        """
+        if self.finished or self.closed:
+            return data
+        data = self._pending + data
+        self._pending = b""
+        
+        if self.framing == "raw":
+            while data and self._phase < 2:
+                index = data.find(ReplProtocol.EOT)
+                if index == -1:
+                    self._emit(data)
+                    return b""
+                self._emit(data[:index])
+                data = data[index + 1:]
+                self._phase += 1
+            if self._phase < 2 or not data:
+                return b""
+            if data[:1] == b">":
+                data = data[1:]
+            self._finish()
+            return data
+        
+        # Modo paste: el Pico responde al EOT con un salto de línea propio
+        if not self._started:
+            if len(data) < 2:
+                self._pending = data
+                return b""
+            if data.startswith(b"\r\n"):
+                data = data[2:]
+            self._started = True
+        
+        prompt = ReplProtocol.NORMAL_PROMPT
+        index = data.find(prompt)
+        if index != -1:
+            self._emit(data[:index])
+            self._finish()
+            return data[index + len(prompt):]
+        
+        # Retener un posible prompt partido entre lecturas
+        keep = next((k for k in range(min(len(prompt) - 1, len(data)), 0, -1)
+                     if prompt.startswith(data[-k:])), 0)
+        if keep:
+            self._pending = data[-keep:]
+            data = data[:-keep]
+        self._emit(data)
+        return b""
+    
+    def _emit(self, data: bytes):
+        text = self._decoder.decode(data)
+        if not text:
+            return
+        if self._phase == 1:
+            self.error += text
+        self._put(text)
+    
+    def _put(self, item):
+        while not self.closed:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def _finish(self):
+        text = self._decoder.decode(b"", final=True)
+        if text:
+            self._put(text)
+        self.finished = True
+        self._put(self._END)
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> str:
+        while True:
+            if self.lines and "\n" in self._line:
+                line, self._line = self._line.split("\n", 1)
+                return line.rstrip("\r")
+            
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.closed:
+                    item = self._END
+                else:
+                    continue
+            
+            if item is self._END:
+                self._closed.set()
+                if self.lines and self._line:
+                    line, self._line = self._line, ""
+                    return line
+                raise StopIteration
+            
+            if not self.lines:
+                return item
+            self._line += item
+    
+    def cancel(self):
+        """Interrumpir el script (Ctrl+C); la iteración sigue hasta el prompt"""
+        if not self.finished and not self.cancelled:
+            self.cancelled = True
+            self._cancel()
+    
+    def close(self, cancel: bool = True):
+        """
+        Dejar de recibir salida
+        
+        Args:
+            cancel: Si True y el script sigue ejecutándose, interrumpirlo
+        """
+        if cancel:
+            self.cancel()
+        self._closed.set()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+class OutputDispatcher:
+    """
+    Entrega la salida al callback del usuario desde un hilo propio, en lotes
+    
+    El hilo lector solo encola texto (nunca espera al callback): un callback
+    lento (logging, print, reenvío por socket) ya no frena la lectura del
+    puerto ni provoca que se pierdan datos en el Pico. Los chunks se juntan
+    durante max_delay segundos o hasta max_chars caracteres y se entregan
+    en una sola llamada, en orden de llegada.
+    
+    Si el callback se atrasa más de max_pending caracteres se descarta lo
+    más antiguo (contado en `dropped`).
+    """
+    
+    DEFAULT_MAX_DELAY = 0.02
+    DEFAULT_MAX_CHARS = 4096
+    DEFAULT_MAX_PENDING = 1 << 20
+    
+    def __init__(self, callback: Callable[[str], None], max_delay: float = DEFAULT_MAX_DELAY,
+                 max_chars: int = DEFAULT_MAX_CHARS, max_pending: int = DEFAULT_MAX_PENDING):
+        """
+        Args:
+            callback: Función que recibe la salida como string
+            max_delay: Segundos que se espera a juntar más salida antes de entregar
+            max_chars: Tamaño de lote que se entrega sin esperar
+            max_pending: Máximo de caracteres sin entregar antes de descartar
+        """
+        self.callback = callback
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.batches = 0
+        self._chunks: deque = deque()
+        self._pending = 0
+        self._busy = False             # El worker está dentro del callback
+        self._stop = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+    
+    def submit(self, text: str):
+        """Encolar salida (lo llama el hilo lector; nunca bloquea)"""
+        with self._cond:
+            self._chunks.append(text)
+            self._pending += len(text)
+            while self._pending > self.max_pending and len(self._chunks) > 1:
+                old = self._chunks.popleft()
+                self._pending -= len(old)
+                if not self.dropped:
+                    logger.warning("⚠️  Callback de salida atrasado, descartando salida antigua")
+                self.dropped += len(old)
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+    
+    def _worker(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._chunks or self._stop)
+                if not self._chunks:
+                    return
+                # Ventana de agrupación desde el primer chunk del lote
+                deadline = time.monotonic() + self.max_delay
+                while self._pending < self.max_chars and not self._stop:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = "".join(self._chunks)
+                self._chunks.clear()
+                self._pending = 0
+                self._busy = True
+            try:
+                self.callback(batch)
+            except Exception as e:
+                logger.error(f"Error en callback de salida: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self.batches += 1
+                    self._cond.notify_all()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que toda la salida encolada haya sido entregada"""
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._chunks and not self._busy, timeout)
+    
+    def close(self, timeout: float = 1.0):
+        """Entregar lo pendiente (sin esperar la ventana) y detener el worker"""
+        with self._cond:
+            thread, self._thread = self._thread, None
+            self._stop = True
+            self._cond.notify_all()
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout)
+
+class ReplProtocol:
+    """
+    Lógica del protocolo REPL de MicroPython, independiente de la E/S
+    
+    Cada intercambio está escrito como un generador de "pasos" que produce
+    operaciones de E/S (escribir, leer hasta un marcador, leer N bytes...) y
+    recibe su resultado. PicoConnection ejecuta los pasos con E/S bloqueante
+    y AsyncPicoConnection con await, compartiendo el mismo protocolo.
+    """
+    
+    # Constantes del protocolo MicroPython
+    NORMAL_MODE_CMD = b"\x02"      # Ctrl+B - Entrar en modo normal
+    RAW_MODE_CMD = b"\x01"         # Ctrl+A - Entrar en modo raw
+    INTERRUPT_CMD = b"\x03"        # Ctrl+C - Interrumpir ejecución
+    SOFT_REBOOT_CMD = b"\x04"      # Ctrl+D - Soft reboot
+    PASTE_MODE_CMD = b"\x05"       # Ctrl+E - Entrar en modo paste
+    EOT = b"\x04"                  # End of Transmission
+    RAW_PASTE_CMD = b"\x05A\x01"    # Ctrl+E A Ctrl+A - Entrar en modo raw-paste (desde modo raw)
+    RAW_PASTE_SUPPORTED = b"R\x01"   # Respuesta: raw-paste soportado
+    RAW_PASTE_UNSUPPORTED = b"R\x00" # Respuesta: raw-paste entendido pero no soportado
+    FLOW_CONTROL_ACK = b"\x01"     # Incremento de ventana en modo raw-paste
+    
+    # Resultado de _raw_paste_write_steps
+    RAW_PASTE_SENT = "sent"                # Datos enviados: falta el EOT con que el Pico acusa el fin
+    RAW_PASTE_ABORTED = "aborted"          # El Pico cortó la recepción con EOT (ya se le respondió)
+    RAW_PASTE_UNAVAILABLE = "unavailable"  # Firmware sin raw-paste: el Pico sigue en modo raw
+    
+    # Prompts de MicroPython
+    NORMAL_PROMPT = b">>> "
+    RAW_PROMPT = b"\r\n>"
+    FIRST_RAW_PROMPT = b"raw REPL; CTRL-B to exit\r\n>"
+    PASTE_MODE_PREFIX = b"=== "
+    
+    # Límites de espera del protocolo (solo cotas superiores, no sleeps fijos)
+    PROMPT_TIMEOUT = 0.5           # Espera máxima de un prompt tras Ctrl+C/Ctrl+B/Ctrl+E
+    PASTE_CHUNK_SIZE = 64          # Bytes por chunk en modo paste
+    PASTE_CHUNK_TIMEOUT = 0.05     # Espera máxima del eco de cada chunk
+    EXEC_TIMEOUT = 7.0             # Espera máxima del prompt tras ejecutar
+    HANDSHAKE_TIMEOUTS = (0.2, 0.5, 1.0)  # Esperas crecientes si la placa aún está enumerando
+    INTERRUPT_TIMEOUT = 0.25       # Espera del prompt tras cada Ctrl+C al detener un script
+    INTERRUPT_REPEATS = 3          # Ctrl+C extra (scripts que capturan KeyboardInterrupt)
+    SOFT_REBOOT_TIMEOUT = 1.0      # Espera del banner tras Ctrl+D
+    HARD_RESET_TIMEOUT = 3.0       # Espera del banner tras machine.reset()
+    HARD_RESET_CODE = "import machine\nmachine.reset()"
+    
+    # Niveles de escalada al detener un script, de menor a mayor costo
+    STOP_INTERRUPT = "interrupt"       # Ctrl+C
+    STOP_REPEAT = "repeat"             # Ctrl+C repetidos
+    STOP_SOFT_REBOOT = "soft_reboot"   # Ctrl+D: se pierde el estado de la VM
+    STOP_HARD_RESET = "hard_reset"     # machine.reset(): el USB se re-enumera
+    STOP_LEVELS = (STOP_INTERRUPT, STOP_REPEAT, STOP_SOFT_REBOOT, STOP_HARD_RESET)
+    
+    # Transferencia de archivos en bloques base64 con CRC32
+    TRANSFER_BLOCK_SIZE = 2048     # Bytes de archivo por bloque
+    TRANSFER_RETRIES = 2           # Reintentos por bloque con CRC incorrecto
+    
+    # Helper que se ejecuta en el Pico (modo raw) para leer/escribir bloques
+    TRANSFER_HELPER = """
+import binascii
+try:
+    from binascii import crc32 as _c
+except ImportError:
+    _c = None
+_f = open(%r, %r)
+def _w(b, c):
+    d = binascii.a2b_base64(b)
+    if _c and _c(d) != c:
+        print('E')
+    else:
+        _f.write(d)
+        print('K')
+def _r(o, n):
+    _f.seek(o)
+    d = _f.read(n)
+    print(binascii.b2a_base64(d).decode().strip(), _c(d) if _c else -1)
+"""
+    TRANSFER_CLEANUP = "_f.close()\ndel _f, _w, _r, _c"
+    
+    REMOVE_HELPER = """
+import os
+try:
+    os.remove(%r)
+except OSError:
+    pass
+"""
+    
+    # Helper que descarta una transferencia a medias: cierra el archivo del
+    # TRANSFER_HELPER si quedó abierto y borra el temporal
+    TRANSFER_ABORT = """
+try:
+    _f.close()
+    del _f, _w, _r, _c
+except NameError:
+    pass
+""" + REMOVE_HELPER
+    
+    # Capacidades del firmware que se consultan al conectar (un solo intercambio):
+    # versión de .mpy y descompresor disponible
+    CAPS_HELPER = """
+import sys
+print(getattr(sys.implementation, '_mpy', 0))
+try:
+    import deflate
+    print('deflate')
+except ImportError:
+    try:
+        import zlib
+        print('zlib' if hasattr(zlib, 'DecompIO') else '-')
+    except ImportError:
+        print('-')
+"""
+    
+    # Transferencia comprimida (zlib con ventana chica: poca RAM en el Pico)
+    COMPRESS_MIN_SIZE = 512        # Menos bytes no vale la pena comprimir
+    COMPRESS_MAX_RATIO = 0.8       # Solo si se ahorra al menos un 20%
+    COMPRESS_WBITS = 10            # Ventana de 1 KB
+    
+    # Helper que descomprime (como stream) un archivo subido comprimido y
+    # borra el temporal; imprime el CRC32 de lo descomprimido
+    DECOMPRESS_HELPER = """
+import os
+try:
+    from binascii import crc32 as _c
+except ImportError:
+    _c = None
+def _d(i, o, m):
+    if m == 'deflate':
+        import deflate
+        z = deflate.DeflateIO(i, deflate.ZLIB)
+    else:
+        import zlib
+        z = zlib.DecompIO(i, %d)
+    b = bytearray(512)
+    v = memoryview(b)
+    c = 0
+    with open(o, 'wb') as f:
+        while True:
+            n = z.readinto(b)
+            if not n:
+                break
+            f.write(v[:n])
+            if _c:
+                c = _c(v[:n], c)
+    return c if _c else -1
+try:
+    with open(%%r, 'rb') as _i:
+        print(_d(_i, %%r, %%r))
+finally:
+    os.remove(%%r)
+del _d, _c
+""" % COMPRESS_WBITS
+    
+    # Precompilación a .mpy con mpy-cross (ver _compile_mpy)
+    MPY_CROSS = os.environ.get("MPY_CROSS", "mpy-cross")
+    MPY_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pico_mpy")
+    MPY_NO_COMPILE = {"boot.py", "main.py"}   # El firmware los ejecuta como fuente
+    # Arquitecturas según sys.implementation._mpy (bits 10-15)
+    MPY_ARCHS = (None, "x86", "x64", "armv6", "armv6m", "armv7m", "armv7em",
+                 "armv7emsp", "armv7emdp", "xtensa", "xtensawin", "rv32imc")
+    _mpy_cross_versions: Dict[str, Optional[Tuple[int, int]]] = {}
+    
+    # Caché de scripts en el Pico por contenido (ver _cached_script_steps)
+    SCRIPT_CACHE_DIR = "/.cache"
+    SCRIPT_CACHE_MIN_SIZE = 256    # Scripts más cortos se envían completos
+    SCRIPT_CACHE_RESERVE = 64 * 1024  # Flash libre que la caché nunca ocupa
+    
+    # Helper que crea el directorio de caché, lista sus scripts y quita los
+    # indicados; imprime "tamaño nombre" por entrada y al final el espacio libre
+    SCRIPT_CACHE_HELPER = """
+import os
+try:
+    os.mkdir(%r)
+except OSError:
+    pass
+for n in %r:
+    try:
+        os.remove(%r + '/' + n)
+    except OSError:
+        pass
+for e in os.ilistdir(%r):
+    print(os.stat(%r + '/' + e[0])[6], e[0])
+_s = os.statvfs('/')
+print(_s[0] * _s[3])
+del _s
+"""
+    # Stub que ejecuta un script precompilado de la caché (un .mpy solo se carga con import)
+    SCRIPT_CACHE_IMPORT = """import sys
+sys.path.insert(0, %r)
+try:
+    __import__(%r)
+finally:
+    sys.path.pop(0)
+    sys.modules.pop(%r, None)
+"""
+    
+    # Operaciones de E/S que producen los pasos del protocolo
+    _OP_WRITE = "write"              # (op, datos) -> None
+    _OP_READ_UNTIL = "read_until"    # (op, marcadores, timeout) -> (datos, encontrado)
+    _OP_READ_COUNT = "read_count"    # (op, n, timeout) -> datos
+    _OP_AVAILABLE = "available"      # (op,) -> bytes pendientes
+    _OP_CLEAR = "clear"              # (op,) -> datos descartados
+    _OP_CALL = "call"                # (op, función, *args) -> resultado (trabajo del host: minify, mpy-cross)
+    
+    # Modo del REPL: "unknown", "normal", "raw", "paste" o "running" (ejecutando
+    # código enviado). Solo lo cambian los pasos, con el prompt que responde a
+    # su propio comando (_set_mode), y el inicio de una ejecución. La salida de
+    # un script nunca cuenta: puede contener ">>> " o "=== " cualquiera.
+    current_mode = "unknown"
+    timeout = 5.0
+    _raw_paste_supported: Optional[bool] = None
+    
+    def _set_mode(self, response: bytes, found: bool):
+        """
+        Fijar current_mode según el prompt con el que termina una respuesta esperada
+        
+        Args:
+            response: Datos devueltos por _OP_READ_UNTIL (terminan en el marcador)
+            found: Si se encontró el marcador; si no, el modo no cambia
+        """
+        if not found:
+            return
+        if response.endswith(self.NORMAL_PROMPT):
+            mode = "normal"
+        elif response.endswith(self.FIRST_RAW_PROMPT) or response.endswith(self.EOT + b">"):
+            mode = "raw"
+        elif response.endswith(self.PASTE_MODE_PREFIX):
+            mode = "paste"
+        else:
+            return
+        if mode != self.current_mode:
+            logger.debug(f"Modo REPL: {self.current_mode} → {mode}")
+            self.current_mode = mode
+    
+    def _normal_mode_steps(self):
+        """
+        Pasos: llevar el REPL al prompt normal
+        
+        No hace nada si ya está en modo normal. Interrumpe solo si hay código
+        ejecutándose, modo paste o el modo es desconocido, y envía Ctrl+B solo
+        desde modo raw. Devuelve True si se vio el prompt normal.
+        """
+        if self.current_mode == "normal":
+            return True
+        
+        logger.info("Asegurando modo normal...")
+        if self.current_mode in ("running", "paste", "unknown"):
+            yield from self._interrupt_steps()
+        
+        if self.current_mode != "normal":
+            yield (self._OP_CLEAR,)
+            yield (self._OP_WRITE, self.NORMAL_MODE_CMD)
+            response, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT,), self.PROMPT_TIMEOUT)
+            logger.debug(f"Respuesta modo normal: {response.decode('utf-8', errors='ignore')}")
+            self._set_mode(response, found)
+        
+        return self.current_mode == "normal"
+    
+    def _handshake_steps(self):
+        """
+        Pasos: Ctrl+C Ctrl+B y esperar banner + prompt normal
+        
+        Retorna en cuanto llega el prompt posterior al banner (un ida y
+        vuelta). Solo si la placa no responde (aún enumerando o arrancando)
+        se reintenta con esperas más largas (HANDSHAKE_TIMEOUTS).
+        Devuelve True si el REPL respondió.
+        """
+        for timeout in self.HANDSHAKE_TIMEOUTS:
+            yield (self._OP_CLEAR,)
+            yield (self._OP_WRITE, self.INTERRUPT_CMD + self.NORMAL_MODE_CMD)
+            
+            # Ctrl+C puede devolver su propio prompt antes del banner de Ctrl+B
+            deadline = time.monotonic() + timeout
+            response = b""
+            prompted = False
+            while True:
+                chunk, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT,),
+                                      max(deadline - time.monotonic(), 0))
+                response += chunk
+                if not found:
+                    break
+                prompted = True
+                if b"MicroPython" in response:
+                    break
+            
+            if prompted:
+                self.current_mode = "normal"
+                return True
+            logger.debug(f"Sin respuesta del REPL en {timeout}s, reintentando...")
+        return False
+    
+    def _interrupt_steps(self):
+        """Pasos: Ctrl+C y esperar el prompt (normal o raw). Devuelve True si volvió"""
+        yield (self._OP_CLEAR,)
+        yield (self._OP_WRITE, self.INTERRUPT_CMD)
+        if self.current_mode == "raw":
+            return True  # Modo raw sin ejecución: Ctrl+C no produce respuesta
+        response, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT, self.EOT + b">"), self.PROMPT_TIMEOUT)
+        self._set_mode(response, found)
+        return found
+    
+    def _stop_steps(self, max_level: str = STOP_SOFT_REBOOT):
+        """
+        Pasos: detener el script en ejecución escalando solo si hace falta
+        
+        Cada nivel se confirma con el prompt (KeyboardInterrupt + ">>> " o
+        "EOT >" en modo raw); se pasa al siguiente solo si el prompt no llega
+        a tiempo: Ctrl+C, Ctrl+C repetidos, soft reboot y machine.reset().
+        
+        Args:
+            max_level: Último nivel permitido (uno de STOP_LEVELS)
+        
+        Returns:
+            InterruptResult con el nivel que hizo falta y el tiempo empleado
+        """
+        start_time = time.monotonic()
+        levels = self.STOP_LEVELS[:self.STOP_LEVELS.index(max_level) + 1]
+        prompts = (self.NORMAL_PROMPT, self.EOT + b">")
+        attempts = 1
+        
+        yield (self._OP_CLEAR,)
+        yield (self._OP_WRITE, self.INTERRUPT_CMD)
+        if self.current_mode == "raw":
+            # Modo raw sin ejecución: Ctrl+C no produce respuesta
+            return InterruptResult(True, self.STOP_INTERRUPT, time.monotonic() - start_time, attempts)
+        response, found = yield (self._OP_READ_UNTIL, prompts, self.INTERRUPT_TIMEOUT)
+        level = self.STOP_INTERRUPT
+        
+        if not found and self.STOP_REPEAT in levels:
+            level = self.STOP_REPEAT
+            for _ in range(self.INTERRUPT_REPEATS):
+                attempts += 1
+                yield (self._OP_WRITE, self.INTERRUPT_CMD)
+                response, found = yield (self._OP_READ_UNTIL, prompts, self.INTERRUPT_TIMEOUT)
+                if found:
+                    break
+        
+        if not found and self.STOP_SOFT_REBOOT in levels:
+            level = self.STOP_SOFT_REBOOT
+            attempts += 1
+            logger.warning("⚠️  El script no responde a Ctrl+C, haciendo soft reboot")
+            yield (self._OP_WRITE, self.INTERRUPT_CMD + self.SOFT_REBOOT_CMD)
+            response, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT, self.FIRST_RAW_PROMPT),
+                                     self.SOFT_REBOOT_TIMEOUT)
+        
+        if not found and self.STOP_HARD_RESET in levels:
+            level = self.STOP_HARD_RESET
+            attempts += 1
+            logger.warning("⚠️  El Pico no responde, reiniciando con machine.reset()")
+            if self.current_mode == "raw":
+                command = self.HARD_RESET_CODE.encode() + self.EOT
+            else:
+                command = self.HARD_RESET_CODE.replace("\n", "\r").encode() + b"\r"
+            yield (self._OP_WRITE, self.INTERRUPT_CMD + command)
+            # En hardware real el puerto desaparece y vuelve (ver PortWatcher)
+            response, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT,), self.HARD_RESET_TIMEOUT)
+        
+        seconds = time.monotonic() - start_time
+        self._set_mode(response, found)
+        if found:
+            logger.info(f"🛑 Ejecución detenida (nivel: {level}, {seconds:.3f}s)")
+            return InterruptResult(True, level, seconds, attempts)
+        logger.error(f"❌ No se pudo detener la ejecución ({seconds:.3f}s)")
+        return InterruptResult(False, "", seconds, attempts)
+    
+    def _enter_raw_steps(self):
+        """Pasos: entrar en modo raw (si no lo está ya). Devuelve True si el Pico lo confirmó"""
+        if self.current_mode == "raw":
+            # En modo raw Ctrl+C solo vacía la entrada pendiente, sin respuesta
+            yield (self._OP_WRITE, self.INTERRUPT_CMD)
+            return True
+        
+        # Desde el prompt normal no hace falta interrumpir
+        command = self.RAW_MODE_CMD
+        if self.current_mode != "normal":
+            command = self.INTERRUPT_CMD + command
+        
+        yield (self._OP_CLEAR,)
+        yield (self._OP_WRITE, command)
+        response, found = yield (self._OP_READ_UNTIL, (self.FIRST_RAW_PROMPT,), self.PROMPT_TIMEOUT)
+        logger.debug(f"Respuesta modo raw: {response.decode('utf-8', errors='ignore')}")
+        self._set_mode(response, found)
+        return found
+    
+    def _exit_raw_steps(self):
+        """Pasos: volver a modo normal desde modo raw esperando el prompt"""
+        if self.current_mode == "normal":
+            return
+        yield (self._OP_WRITE, self.NORMAL_MODE_CMD)
+        response, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT,), self.PROMPT_TIMEOUT)
+        self._set_mode(response, found)
+    
+    def _raw_response_steps(self, timeout: float):
+        """
+        Pasos: leer la respuesta de una ejecución ya aceptada (ver _raw_start_steps)
+        
+        La respuesta es `salida EOT error EOT >`.
+        
+        Args:
+            timeout: Tiempo máximo de espera de la ejecución
+            
+        Returns:
+            Tupla (salida, error, True si la ejecución terminó)
+        """
+        deadline = time.monotonic() + timeout
+        data = bytearray()
+        
+        while data.count(self.EOT) < 2:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            chunk, _ = yield (self._OP_READ_UNTIL, (self.EOT,), remaining)
+            data += chunk
+        
+        finished = data.count(self.EOT) >= 2
+        if finished:
+            _, prompted = yield (self._OP_READ_UNTIL, (b">",), self.PROMPT_TIMEOUT)
+            if prompted:
+                self.current_mode = "raw"
+        
+        parts = bytes(data).split(self.EOT)
+        output = parts[0]
+        error = parts[1] if finished else b""
+        return output, error, finished
+    
+    def _raw_paste_write_steps(self, data: bytes):
+        """
+        Pasos: enviar datos en modo raw-paste respetando la ventana de control de flujo
+        
+        Requiere estar en modo raw. El Pico anuncia el tamaño de ventana y envía
+        un byte 0x01 cada vez que libera una ventana completa.
+        
+        Returns:
+            RAW_PASTE_SENT, RAW_PASTE_ABORTED o RAW_PASTE_UNAVAILABLE
+        """
+        yield (self._OP_WRITE, self.RAW_PASTE_CMD)
+        reply = yield (self._OP_READ_COUNT, 2, self.PROMPT_TIMEOUT)
+        
+        if reply == self.RAW_PASTE_UNSUPPORTED:
+            return self.RAW_PASTE_UNAVAILABLE
+        if reply != self.RAW_PASTE_SUPPORTED:
+            # Firmware antiguo: no entiende el comando y vuelve a imprimir el prompt raw
+            yield (self._OP_READ_UNTIL, (self.FIRST_RAW_PROMPT,), self.PROMPT_TIMEOUT)
+            return self.RAW_PASTE_UNAVAILABLE
+        
+        window = int.from_bytes((yield (self._OP_READ_COUNT, 2, self.PROMPT_TIMEOUT)), 'little')
+        window_remain = window
+        i = 0
+        
+        while i < len(data):
+            while window_remain == 0 or (yield (self._OP_AVAILABLE,)) > 0:
+                ctrl = yield (self._OP_READ_COUNT, 1, self.timeout)
+                if ctrl == self.FLOW_CONTROL_ACK:
+                    window_remain += window
+                elif ctrl == self.EOT:
+                    # El Pico corta la recepción (ej: error de sintaxis al
+                    # compilar): se responde con EOT y no habrá otro acuse;
+                    # lo siguiente ya es la respuesta `EOT error EOT >`
+                    self.current_mode = "running"
+                    yield (self._OP_WRITE, self.EOT)
+                    return self.RAW_PASTE_ABORTED
+                else:
+                    raise RuntimeError(f"Respuesta inesperada en modo raw-paste: {ctrl!r}")
+            
+            chunk = data[i:i + window_remain]
+            yield (self._OP_WRITE, chunk)
+            window_remain -= len(chunk)
+            i += len(chunk)
+        
+        # Fin de datos: el Pico confirma con EOT (ver _raw_start_steps) y empieza a ejecutar
+        self.current_mode = "running"
+        yield (self._OP_WRITE, self.EOT)
+        return self.RAW_PASTE_SENT
+    
+    def _raw_start_steps(self, data: bytes, raw_paste: bool = True):
+        """
+        Pasos: lanzar código estando ya en modo raw, sin esperar su resultado
+        
+        Usa raw-paste si el firmware lo soporta (y raw_paste=True) y modo raw
+        normal si no. Consume el acuse del Pico: EOT en raw-paste, "OK" en raw.
+        
+        Returns:
+            True si el Pico aceptó el código y empezó a ejecutarlo
+        """
+        if raw_paste and self._raw_paste_supported is not False:
+            state = yield from self._raw_paste_write_steps(data)
+            supported = state != self.RAW_PASTE_UNAVAILABLE
+            if self._raw_paste_supported is None and not supported:
+                logger.info("Firmware sin raw-paste, usando modo raw")
+            self._raw_paste_supported = supported
+            if state == self.RAW_PASTE_ABORTED:
+                # El EOT del corte hizo de acuse: leer otro consumiría el de la respuesta
+                return True
+            if supported:
+                # Puede quedar algún 0x01 de control de flujo antes del EOT
+                _, found = yield (self._OP_READ_UNTIL, (self.EOT,), self.PROMPT_TIMEOUT)
+                return found
+        
+        self.current_mode = "running"
+        yield (self._OP_WRITE, data + self.EOT)
+        ack = yield (self._OP_READ_COUNT, 2, self.PROMPT_TIMEOUT)
+        return ack == b"OK"
+    
+    def _raw_exec_steps(self, data: bytes, timeout: float, raw_paste: bool = True):
+        """
+        Pasos: ejecutar código estando ya en modo raw y esperar su resultado
+        
+        Returns:
+            Tupla (salida, error, True si la ejecución terminó)
+        """
+        if not (yield from self._raw_start_steps(data, raw_paste)):
+            return b"", b"", False
+        return (yield from self._raw_response_steps(timeout))
+    
+    def _raw_paste_script_steps(self, script: str, timeout: float):
+        """
+        Pasos: ejecutar un script en modo raw-paste y volver a modo normal
+        
+        Returns:
+            Salida del script, o None si no se pudo entrar en modo raw
+        """
+        if not (yield from self._enter_raw_steps()):
+            return None
+        
+        output, error, finished = yield from self._raw_exec_steps(script.encode('utf-8'), timeout)
+        
+        if finished:
+            yield from self._exit_raw_steps()
+        else:
+            logger.info("⏱️  Script sigue ejecutándose (sin prompt tras el timeout)")
+        
+        return (output + error).decode('utf-8', errors='ignore')
+    
+    def _paste_start_steps(self, script: str):
+        """Pasos: enviar un script en modo paste y lanzarlo, sin esperar su resultado"""
+        # 🔥 INTERRUMPIR EJECUCIÓN ANTERIOR - CRÍTICO PARA NUEVO CÓDIGO
+        # Siempre: un programa que no pasó por estos pasos (ej: lanzado con
+        # execute_command o tras un timeout) puede seguir corriendo
+        logger.info("🛑 Interrumpiendo ejecución anterior...")
+        yield from self._interrupt_steps()
+        yield from self._normal_mode_steps()
+        
+        # Entrar en modo paste
+        yield (self._OP_CLEAR,)
+        yield (self._OP_WRITE, self.PASTE_MODE_CMD)
+        response, found = yield (self._OP_READ_UNTIL, (self.PASTE_MODE_PREFIX,), self.PROMPT_TIMEOUT)
+        logger.debug(f"Respuesta modo paste: {response.decode('utf-8', errors='ignore')}")
+        self._set_mode(response, found)
+        if not found:
+            logger.warning("⚠️  Prompt de modo paste no recibido, continuando...")
+        
+        # Sin '\r' el eco del modo paste tiene exactamente los bytes enviados,
+        # lo que permite usarlo como control de flujo
+        script_bytes = script.replace('\r\n', '\n').replace('\r', '\n').encode('utf-8')
+        chunk_size = self.PASTE_CHUNK_SIZE
+        
+        for i in range(0, len(script_bytes), chunk_size):
+            chunk = script_bytes[i:i + chunk_size]
+            yield (self._OP_WRITE, chunk)
+            yield (self._OP_READ_COUNT, len(chunk), self.PASTE_CHUNK_TIMEOUT)
+        
+        # Enviar EOT para ejecutar
+        self.current_mode = "running"
+        yield (self._OP_WRITE, self.EOT)
+    
+    def _paste_steps(self, script: str, timeout: float):
+        """Pasos: intercambio completo del modo paste. Devuelve la salida"""
+        yield from self._paste_start_steps(script)
+        response, found = yield (self._OP_READ_UNTIL, (self.NORMAL_PROMPT,), timeout)
+        self._set_mode(response, found)
+        if not found:
+            logger.info("⏱️  Script sigue ejecutándose (sin prompt tras el timeout)")
+        
+        return response.decode('utf-8', errors='ignore')
+    
+    def _in_raw_steps(self, steps):
+        """
+        Pasos: ejecutar otros pasos en modo raw y volver al modo anterior aunque fallen
+        
+        Si ya se estaba en modo raw (ej: execute_script_raw_mode) no se sale.
+        
+        Raises:
+            RuntimeError: Si no se pudo entrar en modo raw
+        """
+        was_raw = self.current_mode == "raw"
+        if not (yield from self._enter_raw_steps()):
+            raise RuntimeError("No se pudo entrar en modo raw")
+        try:
+            result = yield from steps
+        except Exception:
+            if not was_raw:
+                yield from self._exit_raw_steps()
+            raise
+        if not was_raw:
+            yield from self._exit_raw_steps()
+        return result
+    
+    def _raw_helper_steps(self, code: str, timeout: Optional[float] = None):
+        """
+        Pasos: ejecutar código auxiliar en modo raw y devolver su salida (requiere modo raw)
+        
+        Raises:
+            RuntimeError: Si el código falla en el Pico o no termina a tiempo
+        """
+        steps = self._raw_exec_steps(code.encode('utf-8'), timeout or self.timeout)
+        output, error, finished = yield from steps
+        if error:
+            raise RuntimeError(f"Error en el Pico: {error.decode('utf-8', errors='ignore').strip()}")
+        if not finished:
+            raise RuntimeError("Timeout esperando respuesta del Pico")
+        return output
+    
+    def _detect_capabilities_steps(self):
+        """Pasos: consultar al firmware la versión de .mpy y el descompresor disponible (una vez por conexión)"""
+        if self._caps_detected:
+            return
+        self._caps_detected = True
+        self.mpy_target = None
+        self.decompressor = None
+        try:
+            output = yield from self._in_raw_steps(self._raw_helper_steps(self.CAPS_HELPER))
+            lines = output.decode('utf-8', errors='ignore').split()
+            value = int(lines[0])
+        except (RuntimeError, ValueError, IndexError) as e:
+            logger.warning(f"⚠️  No se pudieron detectar las capacidades del firmware: {e}")
+            return
+        
+        if len(lines) > 1 and lines[1] in ("deflate", "zlib"):
+            self.decompressor = lines[1]
+            logger.info(f"🔎 Firmware con descompresor {self.decompressor}")
+        if value:
+            arch_index = (value >> 10) & 0x3f
+            arch = self.MPY_ARCHS[arch_index] if arch_index < len(self.MPY_ARCHS) else None
+            self.mpy_target = (value & 0xff, (value >> 8) & 0x3, arch)
+            logger.info(f"🔎 Firmware acepta .mpy v{self.mpy_target[0]}.{self.mpy_target[1]} ({arch or 'bytecode'})")
+            if self.precompile:
+                cross = yield (self._OP_CALL, self._mpy_cross_version)
+                if cross and cross[0] != self.mpy_target[0]:
+                    logger.warning(f"⚠️  {self.MPY_CROSS} genera .mpy v{cross[0]} y el firmware usa "
+                                   f"v{self.mpy_target[0]}, se enviará el código fuente")
+    
+    def _compress_steps(self, data: bytes):
+        """Pasos: comprimir con zlib si el firmware puede descomprimir y se ahorra lo suficiente"""
+        if not self.compress or len(data) < self.COMPRESS_MIN_SIZE:
+            return None
+        yield from self._detect_capabilities_steps()
+        if not self.decompressor:
+            return None
+        compressor = zlib.compressobj(9, zlib.DEFLATED, self.COMPRESS_WBITS)
+        packed = compressor.compress(data) + compressor.flush()
+        if len(packed) > len(data) * self.COMPRESS_MAX_RATIO:
+            return None
+        return packed
+    
+    def _compressed_script_steps(self, script: str):
+        """
+        Pasos: envolver un script en un stub que lo descomprime y lo ejecuta en el Pico
+        
+        El script viaja comprimido con zlib y en base64 (el modo paste y el
+        raw-paste solo admiten texto). Se devuelve sin cambios si no conviene.
+        """
+        data = script.encode('utf-8')
+        packed = yield from self._compress_steps(data)
+        if packed is None:
+            return script
+        payload = base64.b64encode(packed).decode('ascii')
+        if self.decompressor == "deflate":
+            stub = ("exec((lambda d:d.DeflateIO(__import__('io').BytesIO(__import__('binascii')"
+                    f".a2b_base64('{payload}')),d.ZLIB).read())(__import__('deflate')))")
+        else:
+            stub = f"exec(__import__('zlib').decompress(__import__('binascii').a2b_base64('{payload}')))"
+        if len(stub) > len(data) * self.COMPRESS_MAX_RATIO:
+            return script
+        logger.info(f"📦 Script comprimido: {len(data)} → {len(stub)} bytes")
+        return stub
+    
+    def _upload_blocks_steps(self, filename: str, data: bytes):
+        """
+        Pasos: escribir un archivo en bloques base64 con CRC32 (requiere modo raw)
+        
+        Returns:
+            Tupla (bloques enviados, reintentos)
+        """
+        block_size = self.TRANSFER_BLOCK_SIZE
+        blocks = 0
+        retries = 0
+        yield from self._raw_helper_steps(self.TRANSFER_HELPER % (filename, 'wb'))
+        
+        for offset in range(0, len(data), block_size):
+            block = data[offset:offset + block_size]
+            payload = base64.b64encode(block).decode('ascii')
+            command = f"_w('{payload}',{zlib.crc32(block)})"
+            
+            for attempt in range(self.TRANSFER_RETRIES + 1):
+                if (yield from self._raw_helper_steps(command)).strip() == b"K":
+                    break
+                retries += 1
+                logger.warning(f"⚠️  CRC incorrecto en bloque {offset}, reintentando...")
+            else:
+                raise RuntimeError(f"CRC incorrecto en bloque {offset}")
+            blocks += 1
+        
+        yield from self._raw_helper_steps(self.TRANSFER_CLEANUP)
+        return blocks, retries
+    
+    def _upload_raw_steps(self, filename: str, data: bytes, packed: Optional[bytes],
+                          replaced_source: Optional[str]):
+        """
+        Pasos: transferir un archivo estando en modo raw (ver _upload_steps)
+        
+        Returns:
+            Tupla (bloques enviados, reintentos, datos comprimidos o None)
+        """
+        if packed is not None:
+            # Se sube comprimido a un temporal y el Pico lo descomprime
+            temp = filename + ".z"
+            try:
+                blocks, retries = yield from self._upload_blocks_steps(temp, packed)
+                crc = int((yield from self._raw_helper_steps(self.DECOMPRESS_HELPER % (
+                    temp, filename, self.decompressor, temp))).strip())
+                if crc not in (-1, zlib.crc32(data)):
+                    raise RuntimeError("CRC incorrecto tras descomprimir")
+            except (RuntimeError, ValueError) as e:
+                logger.warning(f"⚠️  Transferencia comprimida falló ({e}), enviando sin comprimir")
+                packed = None
+                yield from self._raw_helper_steps(self.TRANSFER_ABORT % temp)
+                # Solo un firmware sin descompresor desactiva la compresión;
+                # un error transitorio afecta únicamente a esta transferencia
+                if "ImportError" in str(e) or "AttributeError" in str(e):
+                    self.decompressor = None
+        if packed is None:
+            blocks, retries = yield from self._upload_blocks_steps(filename, data)
+        if replaced_source:
+            yield from self._raw_helper_steps(self.REMOVE_HELPER % replaced_source)
+        return blocks, retries, packed
+    
+    def _upload_steps(self, filename: str, data: bytes, replaced_source: Optional[str] = None):
+        """
+        Pasos: subir un archivo ya preparado (ver PicoConnection.upload_file)
+        
+        Args:
+            filename: Nombre remoto
+            data: Contenido (ya minificado/compilado)
+            replaced_source: .py remoto a borrar si se subió su .mpy
+        
+        Returns:
+            TransferStats de la transferencia (también en self.last_transfer)
+        
+        Raises:
+            RuntimeError: Si la transferencia falla
+        """
+        start_time = time.monotonic()
+        packed = yield from self._compress_steps(data)
+        blocks, retries, packed = yield from self._in_raw_steps(
+            self._upload_raw_steps(filename, data, packed, replaced_source))
+        
+        self.last_transfer = TransferStats(filename, len(data), time.monotonic() - start_time, blocks, retries,
+                                           len(packed) if packed is not None else len(data))
+        logger.info(f"Archivo {filename} subido exitosamente "
+                    f"({len(data)} bytes, {self.last_transfer.wire_size} enviados, "
+                    f"{self.last_transfer.bytes_per_second:.0f} B/s)")
+        return self.last_transfer
+    
+    def _script_cache_update_steps(self, evict: List[str] = ()):
+        """Pasos: quitar scripts de la caché del Pico y recargar el índice y el espacio libre"""
+        cache_dir = self.SCRIPT_CACHE_DIR
+        output = yield from self._in_raw_steps(self._raw_helper_steps(self.SCRIPT_CACHE_HELPER % (
+            cache_dir, list(evict), cache_dir, cache_dir, cache_dir)))
+        
+        lines = output.decode('utf-8', errors='ignore').split()
+        known = self._script_cache or OrderedDict()
+        entries = OrderedDict()
+        # Los que no se usaron en esta sesión se consideran los más antiguos
+        for size, name in zip(lines[:-1:2], lines[1:-1:2]):
+            if name not in known:
+                entries[name] = int(size)
+        for name in known:
+            if name not in entries and name not in evict:
+                entries[name] = known[name]
+        self._script_cache = entries
+        self._script_cache_free = int(lines[-1])
+    
+    def _cached_script_steps(self, script: str):
+        """
+        Pasos: guardar el script en la caché del Pico y devolver el stub que lo ejecuta
+        
+        💾 CACHÉ POR CONTENIDO:
+        - El script se guarda la primera vez como SCRIPT_CACHE_DIR/<sha256>.py
+        - Las siguientes ejecuciones envían solo exec(open(...).read())
+        - Si no hay espacio se borran los menos usados (LRU), dejando siempre
+          SCRIPT_CACHE_RESERVE bytes libres; si aun así no cabe se envía completo
+        
+        Con precompile=True se guarda el .mpy (ver _compile_mpy) y el stub lo
+        importa; las variables del script quedan en su módulo, no en el REPL.
+        
+        El índice se carga al primer uso de cada conexión: si alguien borra la
+        caché por fuera mientras se está conectado hay que reconectar.
+        """
+        data = script.encode('utf-8')
+        if len(data) < self.SCRIPT_CACHE_MIN_SIZE:
+            return script
+        
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        compiled = None
+        if self.precompile:
+            yield from self._detect_capabilities_steps()
+            compiled = yield (self._OP_CALL, self._compile_mpy, script)
+        if compiled is not None:
+            module = "m" + digest
+            name = module + ".mpy"
+            data = compiled
+            stub = self.SCRIPT_CACHE_IMPORT % (self.SCRIPT_CACHE_DIR, module, module)
+        else:
+            name = digest + ".py"
+            stub = f"exec(open({self.SCRIPT_CACHE_DIR + '/' + name!r}).read())"
+        path = f"{self.SCRIPT_CACHE_DIR}/{name}"
+        
+        if self._script_cache is None:
+            yield from self._script_cache_update_steps()
+        
+        if name not in self._script_cache:
+            need = len(data) + self.SCRIPT_CACHE_RESERVE
+            reclaimable = sum(self._script_cache.values())
+            if self._script_cache_free < need <= self._script_cache_free + reclaimable:
+                evict = []
+                freed = 0
+                for old_name, size in self._script_cache.items():
+                    if self._script_cache_free + freed >= need:
+                        break
+                    evict.append(old_name)
+                    freed += size
+                if evict:
+                    logger.info(f"💾 Caché de scripts llena, quitando {len(evict)} script(s)")
+                    yield from self._script_cache_update_steps(evict)
+            if self._script_cache_free < need:
+                logger.warning("⚠️  Sin espacio para la caché de scripts, enviando completo")
+                return script
+            try:
+                yield from self._upload_steps(path, data)
+            except (RuntimeError, ValueError) as e:
+                logger.error(f"Error subiendo archivo {path}: {e}")
+                return script
+            self._script_cache[name] = len(data)
+            self._script_cache_free -= len(data)
+            logger.info(f"💾 Script guardado en caché: {path}")
+        
+        self._script_cache.move_to_end(name)
+        return stub
+    
+    def _prepare_script_steps(self, script: str, cached: bool = False):
+        """
+        Pasos: preparar un script antes de ejecutarlo
+        
+        Minificación (minify), caché en el Pico (cached o precompile, ver
+        _cached_script_steps) y compresión (compress), en ese orden. Devuelve
+        el script o el stub que hay que enviar.
+        """
+        if self.minify:
+            script = yield (self._OP_CALL, self._minify_script, script)
+        if cached or self.precompile:
+            script = yield from self._cached_script_steps(script)
+        return (yield from self._compressed_script_steps(script))
+    
+    def _minify_script(self, script: str) -> str:
+        """Minificar un script antes de ejecutarlo (si minify está activo)"""
+        if not self.minify:
+            return script
+        result = minify_source(script, self.minify_names)
+        self.last_minify = result
+        logger.info(f"🗜️  Script minificado: {result.original_size} → "
+                    f"{result.minified_size} bytes ({result.saved} ahorrados)")
+        return result.source
+    
+    @classmethod
+    def _mpy_cross_version(cls) -> Optional[Tuple[int, int]]:
+        """Versión de .mpy que genera el mpy-cross local (None si no está instalado)"""
+        if cls.MPY_CROSS not in cls._mpy_cross_versions:
+            version = None
+            try:
+                result = subprocess.run([cls.MPY_CROSS, "--version"], capture_output=True,
+                                        text=True, timeout=5)
+                match = re.search(r"mpy v(\d+)(?:\.(\d+))?", result.stdout)
+                if match:
+                    version = (int(match.group(1)), int(match.group(2) or 0))
+            except (OSError, subprocess.SubprocessError):
+                pass
+            if version is None:
+                logger.warning(f"⚠️  {cls.MPY_CROSS} no disponible, se enviará el código fuente")
+            cls._mpy_cross_versions[cls.MPY_CROSS] = version
+        return cls._mpy_cross_versions[cls.MPY_CROSS]
+    
+    def _compile_mpy(self, source: str, name: str = "<stdin>") -> Optional[bytes]:
+        """
+        Compilar código fuente a .mpy con mpy-cross
+        
+        ⚙️ PRECOMPILACIÓN EN EL HOST:
+        - El Pico no gasta tiempo ni heap compilando
+        - mpy-cross debe generar la misma versión de .mpy que el firmware
+          (mpy_target, ver _detect_capabilities_steps); si no, se usa el
+          código fuente
+        - Los .mpy se guardan en MPY_CACHE_DIR por (hash, versión, arquitectura)
+        
+        Args:
+            source: Código Python
+            name: Nombre de archivo que aparece en los tracebacks
+            
+        Returns:
+            Contenido del .mpy, o None si hay que enviar el código fuente
+            (sin mpy-cross, versión incompatible o error de sintaxis, que así
+            lo reporta el propio Pico)
+        """
+        target = self.mpy_target
+        cross = self._mpy_cross_version()
+        if target is None or cross is None:
+            return None
+        if cross[0] != target[0]:
+            return None
+        
+        version, sub_version, arch = target
+        digest = hashlib.sha256(f"{name}\0{source}".encode('utf-8')).hexdigest()
+        path = os.path.join(self.MPY_CACHE_DIR, f"{digest}-{version}.{sub_version}-{arch or 'bytecode'}.mpy")
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            src_path = os.path.join(tmp, "src.py")
+            out_path = os.path.join(tmp, "out.mpy")
+            with open(src_path, 'w', encoding='utf-8') as f:
+                f.write(source)
+            command = [self.MPY_CROSS, "-o", out_path, "-s", name]
+            if arch:
+                command.append(f"-march={arch}")
+            try:
+                result = subprocess.run(command + [src_path], capture_output=True, text=True, timeout=30)
+            except (OSError, subprocess.SubprocessError) as e:
+                logger.warning(f"⚠️  Error ejecutando {self.MPY_CROSS}: {e}")
+                return None
+            if result.returncode != 0:
+                logger.debug(f"mpy-cross falló en {name}: {result.stderr.strip()}")
+                return None
+            with open(out_path, 'rb') as f:
+                compiled = f.read()
+        
+        try:
+            os.makedirs(self.MPY_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compiled)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"No se pudo guardar el .mpy en caché: {e}")
+        return compiled
+
+class PicoConnection(ReplProtocol):
+    """
+    Clase principal para conectar y comunicarse con Raspberry Pi Pico
+    Implementa el protocolo completo de MicroPython sin dependencia de Thonny
+    Incluye limpieza automática de puertos y manejo de conflictos
+    """
+    
+    PORT_RELEASE_TIMEOUT = 2.0     # Máximo de espera a que se libere el puerto
+    PORT_RELEASE_POLL = 0.05       # Intervalo de sondeo mientras se libera
+    
+    @staticmethod
+    def find_port_holders(port: str) -> List[PortHolder]:
+        """
+        Encontrar los procesos que tienen abierto un puerto serial
+        
+        En Linux recorre /proc/*/fd buscando el dispositivo exacto (mismo
+        st_rdev, así también coinciden symlinks como /dev/serial/by-id/...).
+        Sin /proc (macOS) usa `lsof -t`. El proceso actual nunca se incluye.
+        
+        Args:
+            port: Puerto serial (ej: '/dev/ttyACM0')
+            
+        Returns:
+            Lista de procesos que tienen el puerto abierto
+        """
+        try:
+            target = os.stat(port).st_rdev
+        except OSError:
+            return []
+        
+        pids = set()
+        if os.path.isdir('/proc/self/fd'):
+            for entry in os.listdir('/proc'):
+                if not entry.isdigit():
+                    continue
+                fd_dir = f'/proc/{entry}/fd'
+                try:
+                    fds = os.listdir(fd_dir)
+                except OSError:
+                    continue  # Proceso terminado o sin permisos
+                for fd in fds:
+                    try:
+                        if not os.readlink(f'{fd_dir}/{fd}').startswith('/dev/'):
+                            continue
+                        if os.stat(f'{fd_dir}/{fd}').st_rdev == target:
+                            pids.add(int(entry))
+                            break
+                    except OSError:
+                        continue
+        else:
+            try:
+                result = subprocess.run(['lsof', '-t', port], capture_output=True, text=True, timeout=5)
+                pids.update(int(pid) for pid in result.stdout.split() if pid.isdigit())
+            except (subprocess.TimeoutExpired, FileNotFoundError, PermissionError):
+                pass
+        
+        pids.discard(os.getpid())
+        holders = []
+        for pid in sorted(pids):
+            try:
+                with open(f'/proc/{pid}/comm') as f:
+                    name = f.read().strip()
+                with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                    cmdline = f.read().replace(b'\0', b' ').decode(errors='ignore').strip()
+            except OSError:
+                try:
+                    result = subprocess.run(['ps', '-p', str(pid), '-o', 'comm=,args='],
+                                            capture_output=True, text=True, timeout=5)
+                    name, _, cmdline = result.stdout.strip().partition(' ')
+                except (subprocess.TimeoutExpired, FileNotFoundError, PermissionError):
+                    name, cmdline = '?', ''
+            holders.append(PortHolder(pid, name, cmdline.strip()))
+        return holders
+    
+    @classmethod
+    def release_port(cls, port: str, timeout: Optional[float] = None) -> bool:
+        """
+        Liberar un puerto terminando solo los procesos que lo tienen abierto
+        
+        Envía SIGTERM, y SIGKILL a mitad del plazo a los que sigan vivos.
+        Retorna en cuanto el puerto queda libre, sin espera fija.
+        
+        Args:
+            port: Puerto serial a liberar
+            timeout: Tiempo máximo de espera (default: PORT_RELEASE_TIMEOUT)
+            
+        Returns:
+            True si el puerto quedó libre, False en caso contrario
+        """
+        if timeout is None:
+            timeout = cls.PORT_RELEASE_TIMEOUT
+        
+        holders = cls.find_port_holders(port)
+        if not holders:
+            return True
+        
+        for holder in holders:
+            logger.warning(f"🔪 Puerto {port} ocupado por {holder.name} (PID {holder.pid}), terminándolo...")
+            try:
+                os.kill(holder.pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+        
+        start_time = time.monotonic()
+        killed = False
+        while True:
+            holders = cls.find_port_holders(port)
+            if not holders:
+                logger.info(f"✅ Puerto {port} liberado en {time.monotonic() - start_time:.2f}s")
+                return True
+            elapsed = time.monotonic() - start_time
+            if elapsed >= timeout:
+                break
+            if not killed and elapsed >= timeout / 2:
+                for holder in holders:
+                    try:
+                        os.kill(holder.pid, signal.SIGKILL)
+                    except (ProcessLookupError, PermissionError):
+                        pass
+                killed = True
+            time.sleep(cls.PORT_RELEASE_POLL)
+        
+        logger.error(f"❌ No se pudo liberar {port}: {', '.join(f'{h.name} ({h.pid})' for h in holders)}")
+        return False
+    
+    @classmethod
+    def cleanup_ports(cls, port: Optional[str] = None) -> bool:
+        """
+        Liberar los puertos del Pico ocupados por otros procesos
+        🔧 CONEXIÓN ROBUSTA: Solo se termina a quien tiene abierto el puerto
+        
+        A diferencia de la versión anterior (pkill por patrones + espera fija
+        de 2s), no se tocan procesos ajenos al puerto y se retorna en cuanto
+        el dispositivo queda libre.
+        
+        Args:
+            port: Puerto a liberar (default: todos los puertos Pico detectados)
+            
+        Returns:
+            True si todos los puertos quedaron libres
+        """
+        ports = [port] if port else [p.device for p in cls.find_pico_ports()]
+        logger.info("🧹 Liberando puertos del Pico...")
+        released = all([cls.release_port(device) for device in ports])
+        logger.info("✅ Limpieza de puertos completada")
+        return released
+    
+    @classmethod
+    def check_port_available(cls, port: str) -> bool:
+        """
+        Verifica si un puerto está disponible
+        
+        Intenta el mismo bloqueo exclusivo que usa serial.Serial(exclusive=True)
+        (open no bloqueante + flock), sin lanzar procesos externos. Si no se
+        puede abrir por permisos o no hay fcntl, busca en /proc quién lo tiene.
+        """
+        if fcntl is not None:
+            try:
+                fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+            except FileNotFoundError:
+                logger.warning(f"⚠️  Puerto {port} no existe")
+                return False
+            except OSError as e:
+                if e.errno == errno.EBUSY:
+                    logger.warning(f"⚠️  Puerto {port} ocupado")
+                    return False
+                fd = None  # Sin permisos u otro error: usar /proc
+            if fd is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                except OSError:
+                    logger.warning(f"⚠️  Puerto {port} ocupado (bloqueo exclusivo)")
+                    return False
+                finally:
+                    os.close(fd)
+                logger.debug(f"✅ Puerto {port} libre")
+                return True
+        
+        holders = cls.find_port_holders(port)
+        if holders:
+            logger.warning(f"⚠️  Puerto {port} ocupado por: "
+                           f"{', '.join(f'{h.name} ({h.pid})' for h in holders)}")
+            return False
+        logger.debug(f"✅ Puerto {port} libre")
+        return True
+    
+    # Sincronización por hash de contenido (SHA-256)
+    # La caché de hashes locales va en el directorio del usuario, no en el proyecto
+    SYNC_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pico_sync")
+    # .pico_sync_cache.json: cachés que versiones anteriores dejaban en el proyecto
+    SYNC_IGNORE = {".pico_sync_cache.json", "__pycache__", ".git", ".DS_Store"}
+    
+    # Helper que lista los SHA-256 de todos los archivos bajo un directorio
+    HASH_HELPER = """
+import os, hashlib, binascii
+def _h(d, p):
+    try:
+        l = list(os.ilistdir(d))
+    except OSError:
+        return
+    for e in l:
+        f = (d + '/' if d and d[-1] != '/' else d) + e[0]
+        if e[1] & 0x4000:
+            _h(f, p + e[0] + '/')
+            continue
+        s = hashlib.sha256()
+        with open(f, 'rb') as x:
+            while True:
+                b = x.read(512)
+                if not b:
+                    break
+                s.update(b)
+        print(binascii.hexlify(s.digest()).decode(), p + e[0])
+_h(%r, '')
+del _h
+"""
+    MKDIR_HELPER = """
+import os
+for d in %r:
+    try:
+        os.mkdir(d)
+    except OSError:
+        pass
+"""
+    def __init__(self, port: str, baudrate: int = 115200, timeout: float = 5.0,
+                 rx_capacity: int = 65536, rx_overflow: str = RxBuffer.DROP_OLDEST,
+                 precompile: bool = False, minify: bool = False, minify_names: bool = False,
+                 compress: bool = True):
+        """
+        Inicializar conexión con Pico
+        
+        Args:
+            port: Puerto serial (ej: '/dev/cu.usbmodem1301')
+            baudrate: Velocidad de comunicación (default: 115200)
+            timeout: Timeout para operaciones (default: 2.0)
+            rx_capacity: Bytes preasignados para respuestas (default: 64KB)
+            rx_overflow: Política si la respuesta no cabe: RxBuffer.DROP_OLDEST,
+                RxBuffer.BLOCK (frena al Pico por control de flujo USB) o
+                RxBuffer.SPILL (desborda a un archivo temporal)
+            precompile: Compilar los .py a .mpy en el host con mpy-cross antes
+                de subirlos o ejecutarlos (ver _compile_mpy)
+            minify: Quitar comentarios, docstrings e indentación de los scripts
+                y .py antes de enviarlos (ver minify_source)
+            minify_names: Además, acortar los nombres locales de las funciones
+            compress: Enviar scripts y archivos comprimidos si el firmware tiene
+                deflate o zlib (se detecta en el primer envío grande; si falla se
+                envía sin comprimir)
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.serial: Optional[serial.Serial] = None
+        self.connected = False
+        self.current_mode = "unknown"
+        self._dispatcher: Optional[OutputDispatcher] = None
+        self._reading_thread: Optional[threading.Thread] = None
+        self._stop_reading = False
+        # El hilo lector es el único que lee del puerto. Durante un intercambio
+        # comando/respuesta los bytes van a _rx; fuera de él, al callback.
+        self._rx = RxBuffer(rx_capacity, rx_overflow)
+        self._io_lock = threading.RLock()
+        self._route_lock = threading.Lock()
+        self._exchange_depth = 0
+        self._raw_paste_supported: Optional[bool] = None
+        self.last_transfer: Optional[TransferStats] = None
+        # Scripts en SCRIPT_CACHE_DIR {nombre: tamaño}, del menos al más
+        # recientemente usado; se carga del Pico en el primer uso
+        self._script_cache: Optional[OrderedDict] = None
+        self._script_cache_free = 0
+        self.precompile = precompile
+        self.minify = minify
+        self.minify_names = minify_names
+        self.last_minify: Optional[MinifyResult] = None
+        # (versión, subversión, arquitectura) de .mpy que acepta el firmware;
+        # None si no admite .mpy o aún no se detectó
+        self.mpy_target: Optional[Tuple[int, int, Optional[str]]] = None
+        self.compress = compress
+        # Descompresor del firmware ("deflate", "zlib") o None si no hay
+        self.decompressor: Optional[str] = None
+        self._caps_detected = False
+        # Salida no solicitada: al stream activo (exec_stream) o al callback,
+        # siempre en orden de llegada
+        self._stream: Optional[OutputStream] = None
+        self._deliver_lock = threading.RLock()
+        self._output_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        
+    # Identificación por VID/PID USB (ver también src/lib/usb-id.js)
+    # Solo pares exactos: el VID 0x2E8A también lo usan la Debug Probe
+    # (0x000C) y firmwares C-SDK, que no tienen REPL (ver probe_repl)
+    PICO_USB_IDS = {
+        (0x2E8A, 0x0005): 'Raspberry Pi Pico MicroPython',
+        (0x2E8A, 0x000A): 'Raspberry Pi Pico',
+        (0x2E8A, 0x010A): 'Raspberry Pi Pico',
+        (0x2E8A, 0x400A): 'Raspberry Pi Pico',
+        (0x2E8A, 0x410A): 'Raspberry Pi Pico',
+        (0x2E8A, 0x800A): 'Raspberry Pi Pico',
+        (0x2E8A, 0x810A): 'Raspberry Pi Pico',
+        (0x2E8A, 0xC00A): 'Raspberry Pi Pico',
+        (0x2E8A, 0xC10A): 'Raspberry Pi Pico',
+        (0x2E8A, 0x000F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0x010F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0x400F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0x410F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0x800F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0x810F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0xC00F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0xC10F): 'Raspberry Pi Pico 2',
+        (0x2E8A, 0xF00A): 'Raspberry Pi Pico W',
+        (0x2E8A, 0xF10A): 'Raspberry Pi Pico W',
+        (0x2E8A, 0xF00F): 'Raspberry Pi Pico 2 W',
+        (0x2E8A, 0xF10F): 'Raspberry Pi Pico 2 W',
+        (0xF055, 0x9800): 'MicroPython pyboard',
+        (0xF055, 0x9801): 'MicroPython pyboard',
+        (0xF055, 0x9802): 'MicroPython pyboard',
+    }
+    # Sin información USB solo se aceptan nombres inequívocos
+    PICO_KEYWORDS = ('micropython', 'pico', 'rp2040', 'rp2350', 'raspberry')
+    
+    PROBE_TIMEOUT = 0.5            # Máximo de espera del banner en probe_repl
+    _probe_cache: Dict[str, Optional[str]] = {}
+    _probe_lock = threading.Lock()
+    
+    @classmethod
+    def identify_usb(cls, vid: Optional[int], pid: Optional[int]) -> Optional[str]:
+        """
+        Identificar una placa por VID/PID
+        
+        Returns:
+            Nombre de la placa, o None si no es un Pico/MicroPython conocido
+        """
+        if vid is None:
+            return None
+        return cls.PICO_USB_IDS.get((vid, pid))
+    
+    @classmethod
+    def probe_repl(cls, device: str, serial_number: Optional[str] = None,
+                   use_cache: bool = True) -> Optional[str]:
+        """
+        Confirmar que hay un REPL de MicroPython en un solo ida y vuelta
+        
+        Envía Ctrl+C Ctrl+B y espera el banner hasta el prompt. El resultado
+        se guarda por número de serie (o por dispositivo si no tiene).
+        
+        ⚠️  NOTA: Interrumpe el programa que esté corriendo en la placa.
+        
+        Returns:
+            Banner de MicroPython (ej: 'MicroPython v1.22.0 on ...'), o None
+        """
+        key = serial_number or device
+        if use_cache:
+            with cls._probe_lock:
+                if key in cls._probe_cache:
+                    return cls._probe_cache[key]
+        
+        try:
+            with serial.Serial(device, 115200, timeout=cls.PROBE_TIMEOUT,
+                               write_timeout=cls.PROBE_TIMEOUT, exclusive=True) as port:
+                port.reset_input_buffer()
+                port.write(cls.INTERRUPT_CMD + cls.NORMAL_MODE_CMD)
+                # Ctrl+C puede devolver su propio prompt antes del banner
+                deadline = time.monotonic() + cls.PROBE_TIMEOUT
+                response = b""
+                while not (b"MicroPython" in response and response.endswith(cls.NORMAL_PROMPT)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    port.timeout = remaining
+                    chunk = port.read_until(cls.NORMAL_PROMPT)
+                    if not chunk:
+                        break
+                    response += chunk
+        except (serial.SerialException, OSError) as e:
+            # Ocupado o desconectado: no se guarda, puede cambiar
+            logger.debug(f"No se pudo sondear {device}: {e}")
+            return None
+        
+        banner = None
+        for line in response.decode('utf-8', errors='ignore').splitlines():
+            if line.startswith('MicroPython'):
+                banner = line.strip()
+                break
+        
+        with cls._probe_lock:
+            cls._probe_cache[key] = banner
+        logger.debug(f"Sondeo de {device}: {banner or 'sin REPL de MicroPython'}")
+        return banner
+    
+    @classmethod
+    def find_pico_ports(cls, cached: bool = False, probe: bool = False) -> List[PicoPort]:
+        """
+        Encontrar todos los puertos Pico disponibles
+        
+        Los puertos se identifican por pares VID/PID conocidos (PICO_USB_IDS);
+        los adaptadores USB-serie genéricos (FTDI, CH340, CP2102...) y otros
+        dispositivos del mismo fabricante (Debug Probe) ya no se toman por Picos.
+        
+        Args:
+            cached: Si True, responde desde la tabla de PortWatcher (sin
+                enumerar); la tabla se mantiene al día con eventos hotplug
+            probe: Si True, sondea (probe_repl) los puertos no identificados
+                para encontrar MicroPython detrás de adaptadores genéricos o
+                con un PID desconocido
+        
+        Returns:
+            Lista de puertos Pico encontrados
+        """
+        if cached:
+            return get_port_watcher().ports()
+        
+        ports = []
+        
+        for port in serial.tools.list_ports.comports():
+            board = cls.identify_usb(port.vid, port.pid)
+            
+            # Sin VID/PID (algunos drivers): buscar por descripción y fabricante
+            if board is None and port.vid is None:
+                text = f"{port.description or ''} {getattr(port, 'manufacturer', '') or ''}".lower()
+                if any(keyword in text for keyword in cls.PICO_KEYWORDS):
+                    board = port.description
+            
+            # Sondeo opcional del REPL (resultado en caché por número de serie)
+            if board is None and probe:
+                banner = cls.probe_repl(port.device, port.serial_number)
+                if banner:
+                    board = banner.split('; ', 1)[-1]
+            
+            if board:
+                ports.append(PicoPort(
+                    device=port.device,
+                    description=port.description,
+                    manufacturer=getattr(port, 'manufacturer', 'Unknown'),
+                    vid=port.vid,
+                    pid=port.pid,
+                    serial_number=port.serial_number,
+                    board=board
+                ))
+        
+        return ports
+    
+    def connect(self, auto_cleanup=True) -> bool:
+        """
+        Conectar al Pico
+        
+        Args:
+            auto_cleanup: Si True, limpia puertos automáticamente antes de conectar
+        
+        Returns:
+            True si la conexión fue exitosa, False en caso contrario
+        """
+        try:
+            # Limpieza automática del puerto si está habilitada
+            if auto_cleanup:
+                self.cleanup_ports(self.port)
+            
+            # Verificar si el puerto está disponible
+            elif not self.check_port_available(self.port):
+                logger.warning(f"Puerto {self.port} ocupado por otro proceso")
+            
+            logger.info(f"Conectando a {self.port}...")
+            
+            # Crear conexión serial
+            self.serial = serial.Serial(
+                port=self.port,
+                baudrate=self.baudrate,
+                timeout=self.timeout,
+                write_timeout=10,  # Aumentado para scripts largos
+                exclusive=True
+            )
+            
+            # Iniciar hilo de lectura y hacer el handshake adaptativo (sin
+            # espera fija: retorna en cuanto el REPL responde)
+            self.current_mode = "unknown"
+            self._output_decoder.reset()
+            self._script_cache = None
+            self._caps_detected = False
+            with self._exchange():
+                self._stop_reading = False
+                self._reading_thread = threading.Thread(target=self._read_loop, daemon=True)
+                self._reading_thread.start()
+                if not self._run_protocol(self._handshake_steps()):
+                    logger.warning("⚠️  El Pico no respondió al handshake")
+            
+            self.connected = True
+            logger.info("✅ Conectado exitosamente al Pico")
+            if self.precompile:
+                self._detect_capabilities()
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error conectando: {e}")
+            self.connected = False
+            return False
+    
+    def disconnect(self):
+        """Desconectar del Pico"""
+        if self.serial and self.serial.is_open:
+            # El script sigue corriendo en el Pico; solo se deja de recibir
+            if self._stream is not None:
+                self._stream.close(cancel=False)
+                self._stream = None
+            self._stop_reading = True
+            # Despertar al hilo lector bloqueado en read()
+            if hasattr(self.serial, 'cancel_read'):
+                self.serial.cancel_read()
+            if self._reading_thread:
+                self._reading_thread.join(timeout=1)
+            self.serial.close()
+            if self._dispatcher:
+                self._dispatcher.close()
+            self.connected = False
+            self.current_mode = "unknown"
+            logger.info("🔌 Desconectado del Pico")
+    
+    @staticmethod
+    def convert_arduino_to_micropython(arduino_code: str) -> str:
+        """
+        Convierte código Arduino a MicroPython para Pico W
+        
+        🔧 CONVERSIÓN AUTOMÁTICA:
+        - Convierte sintaxis Arduino a MicroPython
+        - Genera código optimizado para Pico W
+        - Maneja conversiones de timing y funciones
+        
+        Args:
+            arduino_code: Código Arduino a convertir
+            
+        Returns:
+            Código MicroPython convertido
+        """
+        logger.info("🔄 Convirtiendo código Arduino a MicroPython...")
+        
+        # Limpiar código Arduino
+        micropython_code = arduino_code
+        
+        # Remover includes y comentarios
+        import re
+        micropython_code = re.sub(r'#include\s*<[^>]+>', '', micropython_code)
+        micropython_code = re.sub(r'//.*$', '', micropython_code, flags=re.MULTILINE)
+        
+        # Convertir variables
+        micropython_code = re.sub(r'int\s+(\w+)\s*=\s*LED_BUILTIN', r'\1 = "LED"', micropython_code)
+        micropython_code = re.sub(r'int\s+(\w+)\s*=\s*(\d+)', r'\1 = \2', micropython_code)
+        
+        # Convertir pinMode a Pin object
+        micropython_code = re.sub(r'pinMode\s*\(\s*(\w+)\s*,\s*OUTPUT\s*\)', r'\1 = Pin(\1, Pin.OUT)', micropython_code)
+        micropython_code = re.sub(r'pinMode\s*\(\s*(\w+)\s*,\s*INPUT\s*\)', r'\1 = Pin(\1, Pin.IN)', micropython_code)
+        
+        # Conversiones de funciones
+        conversions = {
+            'void setup()': 'def setup():',
+            'void loop()': 'def loop():',
+            'digitalWrite(': 'led.value(',
+            'digitalRead(': 'pin.read(',
+            'analogWrite(': 'pin.duty(',
+            'analogRead(': 'pin.read_analog(',
+            'delay(': 'time.sleep(',
+            'Serial.print(': 'print(',
+            'Serial.println(': 'print(',
+            'LED_BUILTIN': '"LED"',
+            'true': 'True',
+            'false': 'False',
+            'HIGH': '1',
+            'LOW': '0',
+            ';': '',
+            '{': '',
+            '}': ''
+        }
+        
+        # Aplicar conversiones
+        for arduino, micropython in conversions.items():
+            micropython_code = micropython_code.replace(arduino, micropython)
+        
+        # Generar código MicroPython simple
+        lines = micropython_code.split('\n')
+        result = []
+        led_pin = '"LED"'
+        
+        # Buscar variable LED
+        for line in lines:
+            if 'led = "LED"' in line or 'led = LED_BUILTIN' in line:
+                led_pin = '"LED"'
+                break
+        
+        # Generar código MicroPython
+        result.append('from machine import Pin')
+        result.append('import time')
+        result.append('')
+        result.append(f'led = Pin({led_pin}, Pin.OUT)')
+        result.append('')
+        result.append('while True:')
+        
+        # Convertir contenido del loop
+        in_loop = False
+        for line in lines:
+            trimmed = line.strip()
+            
+            if trimmed.startswith('def loop():'):
+                in_loop = True
+                continue
+            
+            if in_loop and 'led.value(' in trimmed:
+                # Convertir digitalWrite a led.value
+                match = re.match(r'led\.value\(\s*(\w+)\s*,\s*(\d+)\s*\)', trimmed)
+                if match:
+                    result.append(f'    led.value({match.group(2)})')
+                else:
+                    result.append(f'    {trimmed}')
+            elif in_loop and 'time.sleep(' in trimmed:
+                # Convertir delay a time.sleep
+                match = re.match(r'time\.sleep\(\s*(\d+)\s*\)', trimmed)
+                if match:
+                    seconds = int(match.group(1)) / 1000  # Convertir ms a segundos
+                    result.append(f'    time.sleep({seconds})')
+                else:
+                    result.append(f'    {trimmed}')
+            elif in_loop and trimmed.startswith('print('):
+                result.append(f'    {trimmed}')
+        
+        final_code = '\n'.join(result)
+        logger.info(f"✅ Conversión completada ({len(final_code)} caracteres)")
+        
+        return final_code
+    
+    def _read_loop(self):
+        """
+        Hilo de lectura continua de datos del Pico
+        
+        Bloquea en read(1) y despierta solo cuando llegan datos; luego lee de
+        golpe todo lo pendiente. Es el único dueño del puerto: si hay un
+        intercambio activo los bytes van a su buffer de respuesta, si no al
+        callback de salida.
+        """
+        while not self._stop_reading and self.serial and self.serial.is_open:
+            try:
+                data = self.serial.read(1)
+                if not data:
+                    continue
+                waiting = self.serial.in_waiting
+                if waiting > 0:
+                    data += self.serial.read(waiting)
+                
+                if self._rx.overflow == RxBuffer.BLOCK and self._exchange_depth > 0:
+                    # Sin locks tomados: mientras se espera no se lee el puerto
+                    while (not self._rx.wait_for_space(len(data), 0.1)
+                           and self._exchange_depth > 0 and not self._stop_reading):
+                        pass
+                with self._deliver_lock:
+                    with self._route_lock:
+                        if self._exchange_depth > 0:
+                            self._rx.feed(data)
+                            data = b""
+                    
+                    if data:
+                        self._deliver_output(data)
+            except Exception as e:
+                if not self._stop_reading:
+                    logger.error(f"Error en hilo de lectura: {e}")
+                break
+    
+    def _deliver_output(self, data: bytes):
+        """Entregar salida no solicitada (del script en ejecución) al stream o al callback"""
+        stream = self._stream
+        if stream is not None:
+            data = stream.feed(data)
+            if stream.finished:
+                # El stream vio el prompt de fin del script (su framing lo ubica)
+                self.current_mode = "raw" if stream.framing == "raw" else "normal"
+            if stream.finished or stream.closed:
+                self._stream = None
+            if not data:
+                return
+        
+        # Decodificación incremental: un carácter partido entre dos lecturas
+        # se completa con la siguiente en lugar de perderse
+        decoded_data = self._output_decoder.decode(data)
+        if not decoded_data:
+            return
+        
+        # El callback corre en el hilo del dispatcher, no en el lector
+        if self._dispatcher:
+            self._dispatcher.submit(decoded_data)
+        
+        logger.debug(f"Datos recibidos: {decoded_data}")
+    
+    @contextmanager
+    def _exchange(self):
+        """
+        Intercambio comando/respuesta con el Pico
+        
+        Mientras está activo (admite anidamiento) el hilo lector enruta todos
+        los bytes al buffer de respuesta en lugar del callback. Al terminar,
+        lo que el comando no consumió (ej: salida de un script que sigue
+        ejecutándose) se entrega al callback.
+        """
+        with self._io_lock:
+            with self._route_lock:
+                if self._exchange_depth == 0:
+                    self._rx.clear()
+                    # Un comando nuevo termina el stream activo (el script
+                    # sigue; los pasos del comando lo interrumpen si hace falta)
+                    if self._stream is not None:
+                        self._stream.close(cancel=False)
+                        self._stream = None
+                self._exchange_depth += 1
+            try:
+                yield
+            finally:
+                with self._deliver_lock:
+                    with self._route_lock:
+                        self._exchange_depth -= 1
+                        leftover = self._rx.clear() if self._exchange_depth == 0 else b""
+                    if leftover:
+                        self._deliver_output(leftover)
+    
+    def set_output_callback(self, callback: Optional[Callable[[str], None]],
+                            batch_delay: float = OutputDispatcher.DEFAULT_MAX_DELAY,
+                            batch_chars: int = OutputDispatcher.DEFAULT_MAX_CHARS):
+        """
+        Establecer callback para recibir salida del Pico
+        
+        El callback se llama desde un hilo propio (OutputDispatcher) con la
+        salida agrupada, así nunca frena la lectura del puerto.
+        
+        Args:
+            callback: Función que recibe la salida como string (None: quitarlo)
+            batch_delay: Segundos que se junta salida antes de entregarla (default: 0.02)
+            batch_chars: Caracteres que se entregan sin esperar (default: 4096)
+        """
+        if self._dispatcher:
+            self._dispatcher.close()
+        self._dispatcher = (OutputDispatcher(callback, batch_delay, batch_chars)
+                            if callback else None)
+    
+    def flush_output(self, timeout: Optional[float] = None) -> bool:
+        """Esperar a que el callback haya recibido toda la salida ya leída"""
+        return self._dispatcher.flush(timeout) if self._dispatcher else True
+    
+    def rx_stats(self) -> BufferStats:
+        """Métricas del buffer de respuestas (ocupación máxima, bytes perdidos, etc.)"""
+        return self._rx.stats()
+    
+    def _read_until(self, markers, timeout: float) -> Tuple[bytes, bool]:
+        """
+        Leer del Pico hasta ver alguno de los marcadores o hasta el deadline
+        
+        Args:
+            markers: Marcador (bytes) o tupla de marcadores a esperar
+            timeout: Tiempo máximo de espera en segundos
+            
+        Returns:
+            Tupla (datos leídos, True si se encontró un marcador)
+        """
+        if isinstance(markers, bytes):
+            markers = (markers,)
+        return self._rx.read_until(markers, timeout)
+    
+    def _run_protocol(self, steps):
+        """
+        Ejecutar pasos del protocolo con E/S bloqueante (requiere un intercambio activo)
+        
+        Args:
+            steps: Generador de pasos de ReplProtocol
+            
+        Returns:
+            Valor devuelto por el generador
+        """
+        value = None
+        try:
+            while True:
+                op = steps.send(value)
+                kind = op[0]
+                if kind == self._OP_WRITE:
+                    value = self.serial.write(op[1])
+                elif kind == self._OP_READ_UNTIL:
+                    value = self._rx.read_until(op[1], op[2])
+                elif kind == self._OP_READ_COUNT:
+                    value = self._rx.read_count(op[1], op[2])
+                elif kind == self._OP_AVAILABLE:
+                    value = self._rx.available()
+                elif kind == self._OP_CALL:
+                    value = op[1](*op[2:])
+                else:
+                    value = self._rx.clear()
+        except StopIteration as stop:
+            return stop.value
+    
+    def _ensure_normal_mode(self):
+        """Asegurar que estamos en modo normal"""
+        if self.current_mode == "normal":
+            return
+        
+        with self._exchange():
+            self._run_protocol(self._normal_mode_steps())
+    
+    def _ensure_raw_mode(self):
+        """Asegurar que estamos en modo raw"""
+        if self.current_mode == "raw":
+            return
+        
+        logger.info("Asegurando modo raw...")
+        with self._exchange():
+            if not self._enter_raw_repl():
+                logger.warning("⚠️  Prompt de modo raw no recibido")
+    
+    def _enter_raw_repl(self) -> bool:
+        """
+        Interrumpir y entrar en modo raw esperando el prompt inicial
+        
+        Returns:
+            True si el Pico confirmó el modo raw
+        """
+        return self._run_protocol(self._enter_raw_steps())
+    
+    def _exit_raw_repl(self):
+        """Volver a modo normal desde modo raw esperando el prompt"""
+        self._run_protocol(self._exit_raw_steps())
+    
+    def execute_command(self, command: str) -> str:
+        """
+        Ejecutar comando en modo normal
+        
+        ⚠️ NOTA: Para scripts largos, usar execute_script_paste_mode() es más confiable.
+        Este método es para comandos individuales simples.
+        
+        Args:
+            command: Comando a ejecutar
+            
+        Returns:
+            Respuesta del Pico
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        self._ensure_normal_mode()
+        
+        logger.info(f"Ejecutando comando: {command}")
+        with self._exchange():
+            self._rx.clear()
+            self.serial.write(f"{command}\r\n".encode('utf-8'))
+            
+            # Leer respuesta hasta el siguiente prompt; sin prompt el comando
+            # sigue ejecutándose (ej: un bucle infinito)
+            response, found = self._read_until(self.NORMAL_PROMPT, self.PROMPT_TIMEOUT)
+            self.current_mode = "normal" if found else "running"
+        
+        return response.decode('utf-8', errors='ignore')
+    
+    def execute_script_paste_mode(self, script: str, timeout: Optional[float] = None,
+                                  cached: bool = False) -> str:
+        """
+        Ejecutar script usando modo paste (como Thonny)
+        
+        🎯 IMPORTANTE: Este es el método RECOMENDADO para scripts largos.
+        - ✅ Envía el script completo de una vez
+        - ✅ Más confiable que comandos individuales
+        - ✅ Timing correcto sin interrupciones
+        - ✅ Ejecución atómica
+        - ✅ Interrumpe código anterior automáticamente
+        
+        🔧 DETALLES TÉCNICOS:
+        - Usa Ctrl+E para entrar en modo paste y espera el prompt "=== "
+        - Envía script en chunks de 64 bytes, esperando el eco de cada chunk
+        - Ctrl+D (EOT) para finalizar y ejecutar, espera el prompt ">>> "
+        - Los tiempos antiguos (0.5s, 0.05s por chunk, 7s ejecución) son solo
+          límites superiores: se avanza en cuanto el Pico responde
+        - Interrupción automática del código anterior (Ctrl+C)
+        
+        🚀 PRUEBA EXITOSA CONFIRMADA:
+        - Archivo: test-pico-final.js
+        - Resultado: LED parpadeando correctamente
+        - Método: Script completo en modo paste
+        - Interrupción: Automática del código anterior
+        
+        Args:
+            script: Script Python completo a ejecutar
+            timeout: Tiempo máximo de espera del prompt final (default: EXEC_TIMEOUT)
+            cached: Si True, guardar el script en el Pico y en adelante enviar
+                solo un stub que lo ejecuta (ver _cached_script_steps); con
+                precompile=True siempre se usa la caché
+            
+        Returns:
+            Salida del script
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        if timeout is None:
+            timeout = self.EXEC_TIMEOUT
+        
+        logger.info(f"Ejecutando script en modo paste ({len(script)} caracteres)")
+        
+        with self._exchange():
+            script = self._run_protocol(self._prepare_script_steps(script, cached))
+            return self._run_protocol(self._paste_steps(script, timeout))
+    
+    def execute_script_raw_mode(self, script: str, timeout: Optional[float] = None) -> str:
+        """
+        Ejecutar script usando modo raw
+        
+        Args:
+            script: Script Python a ejecutar
+            timeout: Tiempo máximo de espera de la ejecución (default: EXEC_TIMEOUT)
+            
+        Returns:
+            Salida del script
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        if timeout is None:
+            timeout = self.EXEC_TIMEOUT
+        
+        logger.info(f"Ejecutando script en modo raw ({len(script)} caracteres)")
+        
+        with self._exchange():
+            script = self._run_protocol(self._compressed_script_steps(self._minify_script(script)))
+            
+            # Asegurar modo raw
+            self._ensure_raw_mode()
+            steps = self._raw_exec_steps(script.encode('utf-8'), timeout, raw_paste=False)
+            output, error, _ = self._run_protocol(steps)
+        
+        return (output + error).decode('utf-8', errors='ignore')
+    
+    def _raw_exec(self, code: str, timeout: Optional[float] = None) -> bytes:
+        """
+        Ejecutar código auxiliar en modo raw y devolver su salida (requiere un intercambio activo)
+        
+        Raises:
+            RuntimeError: Si el código falla en el Pico o no termina a tiempo
+        """
+        return self._run_protocol(self._raw_helper_steps(code, timeout))
+    
+    def execute_script_raw_paste(self, script: str, timeout: Optional[float] = None,
+                                 cached: bool = False) -> str:
+        """
+        Ejecutar script usando modo raw-paste (Ctrl+A, Ctrl+E "A" Ctrl+A)
+        
+        🚀 RECOMENDADO para scripts grandes generados:
+        - El Pico anuncia un tamaño de ventana y pide más datos con 0x01
+        - El script se transmite a la velocidad de la línea USB CDC
+        - Sin eco ni pausas entre chunks
+        
+        Fallback automático:
+        - Firmware sin raw-paste → modo raw normal
+        - Sin respuesta en modo raw → modo paste
+        
+        Args:
+            script: Script Python completo a ejecutar
+            timeout: Tiempo máximo de espera de la ejecución (default: EXEC_TIMEOUT)
+            cached: Si True, guardar el script en el Pico y en adelante enviar
+                solo un stub que lo ejecuta (ver _cached_script_steps); con
+                precompile=True siempre se usa la caché
+            
+        Returns:
+            Salida del script
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        if timeout is None:
+            timeout = self.EXEC_TIMEOUT
+        
+        logger.info(f"Ejecutando script en modo raw-paste ({len(script)} caracteres)")
+        
+        with self._exchange():
+            script = self._run_protocol(self._prepare_script_steps(script, cached))
+            result = self._run_protocol(self._raw_paste_script_steps(script, timeout))
+            if result is None:
+                logger.warning("⚠️  Modo raw no disponible, usando modo paste")
+                # El script ya pasó por minify/caché/compresión: solo cambia el modo
+                result = self._run_protocol(self._paste_steps(script, timeout))
+        
+        return result
+    
+    def exec_stream(self, script: str, lines: bool = False,
+                    max_pending: int = OutputStream.DEFAULT_MAX_PENDING) -> OutputStream:
+        """
+        Ejecutar un script y recibir su salida a medida que llega
+        
+        🚀 PARA PROGRAMAS LARGOS O INFINITOS (while True, sensores, LEDs):
+        - Retorna apenas el Pico acepta el script, sin esperar a que termine
+        - La salida se itera con memoria acotada y backpressure (OutputStream)
+        - stream.cancel() interrumpe el script
+        - Modo raw-paste (salida y error separados) con fallback a modo paste
+        - Cualquier otro comando sobre la conexión termina el stream
+        
+        Args:
+            script: Script Python completo a ejecutar
+            lines: Si True, iterar por líneas en lugar de chunks
+            max_pending: Máximo de chunks sin consumir antes de frenar al Pico
+            
+        Returns:
+            OutputStream iterable con la salida del script
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        logger.info(f"Ejecutando script con salida en streaming ({len(script)} caracteres)")
+        with self._exchange():
+            script = self._run_protocol(self._compressed_script_steps(self._minify_script(script)))
+            if self._enter_raw_repl():
+                framing = "raw"
+                accepted = self._run_protocol(self._raw_start_steps(script.encode('utf-8')))
+            else:
+                logger.warning("⚠️  Modo raw no disponible, usando modo paste")
+                framing = "paste"
+                self._run_protocol(self._paste_start_steps(script))
+                accepted = True
+            if not accepted:
+                raise RuntimeError("El Pico no aceptó el script")
+            
+            # Lo que llegue desde aquí (incluido lo que quede en el buffer al
+            # cerrar el intercambio) va al stream
+            stream = OutputStream(framing, self._send_interrupt, lines, max_pending)
+            self._stream = stream
+        return stream
+    
+    def _send_interrupt(self):
+        """Enviar Ctrl+C sin esperar respuesta (cancelación de exec_stream)"""
+        if self.serial and self.serial.is_open:
+            self.serial.write(self.INTERRUPT_CMD)
+    
+    def interrupt_execution(self, max_level: str = ReplProtocol.STOP_SOFT_REBOOT) -> InterruptResult:
+        """
+        Detener el script en ejecución confirmando con el prompt
+        
+        ⚡ ESCALADA SOLO SI HACE FALTA:
+        - Ctrl+C y se espera KeyboardInterrupt / prompt (normalmente ~ms)
+        - Si no vuelve a tiempo: Ctrl+C repetidos, luego soft reboot
+          (pierde el estado de la VM) y, si max_level lo permite, machine.reset()
+        
+        Args:
+            max_level: Último nivel permitido (ReplProtocol.STOP_LEVELS)
+        
+        Returns:
+            InterruptResult con el nivel que hizo falta y el tiempo empleado
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        logger.info("Interrumpiendo ejecución...")
+        with self._exchange():
+            return self._run_protocol(self._stop_steps(max_level))
+    
+    def force_interrupt_execution(self) -> InterruptResult:
+        """Detener la ejecución permitiendo llegar hasta machine.reset()"""
+        return self.interrupt_execution(self.STOP_HARD_RESET)
+    
+    def execute_new_code_with_interrupt(self, script: str) -> str:
+        """
+        Ejecutar nuevo código con interrupción automática del anterior
+        
+        🎯 MÉTODO MEJORADO: Combina interrupción + ejecución en un solo paso
+        - ✅ Detiene el código anterior (ver interrupt_execution)
+        - ✅ Conserva el estado de la VM si basta con Ctrl+C
+        - ✅ Ejecuta nuevo código inmediatamente
+        
+        Args:
+            script: Script Python completo a ejecutar
+            
+        Returns:
+            Salida del script
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        logger.info(f"🔄 Ejecutando nuevo código con interrupción ({len(script)} caracteres)")
+        
+        with self._exchange():
+            logger.info("🛑 Interrumpiendo código anterior...")
+            result = self.interrupt_execution()
+            if not result.stopped:
+                raise RuntimeError("No se pudo detener el código anterior")
+            return self.execute_script_paste_mode(script)
+    
+    def soft_reboot(self):
+        """Realizar soft reboot del Pico"""
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        logger.info("Realizando soft reboot...")
+        with self._exchange():
+            self._rx.clear()
+            self.serial.write(self.SOFT_REBOOT_CMD)
+            
+            # Leer respuesta hasta el prompt (en modo raw el Pico sigue en raw)
+            response, found = self._read_until((self.NORMAL_PROMPT, self.FIRST_RAW_PROMPT), 1.0)
+            self.current_mode = "unknown"
+            self._set_mode(response, found)
+        logger.debug(f"Respuesta soft reboot: {response.decode('utf-8', errors='ignore')}")
+    
+    def upload_file(self, filename: str, content: Union[str, bytes]) -> bool:
+        """
+        Subir archivo al Pico
+        
+        🚀 TRANSFERENCIA BINARIA:
+        - Un helper en el Pico (modo raw) recibe bloques base64 de 2 KB
+        - Cada bloque lleva CRC32 y se reintenta si llega corrupto
+        - Funciona igual para texto y binario (sin escapes ni líneas perdidas)
+        - Si el firmware tiene deflate/zlib se envía comprimido y el Pico lo
+          descomprime como stream (se verifica el CRC32 del resultado)
+        - Estadísticas en self.last_transfer (bytes/s)
+        
+        Args:
+            filename: Nombre del archivo
+            content: Contenido del archivo (str se codifica en UTF-8)
+            
+        Returns:
+            True si fue exitoso, False en caso contrario
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        data = content.encode('utf-8') if isinstance(content, str) else bytes(content)
+        
+        # Si el .py se sube como .mpy se borra el .py remoto (tendría
+        # prioridad al importar)
+        target, data = self._prepare_upload(filename, data)
+        replaced_source = filename if target != filename else None
+        filename = target
+        
+        try:
+            with self._exchange():
+                self._run_protocol(self._upload_steps(filename, data, replaced_source))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error subiendo archivo {filename}: {e}")
+            return False
+    
+    def download_file(self, filename: str, binary: bool = False) -> Optional[Union[str, bytes]]:
+        """
+        Descargar archivo del Pico
+        
+        Usa el mismo helper que upload_file: bloques base64 con CRC32.
+        
+        Args:
+            filename: Nombre del archivo
+            binary: Si True, devuelve bytes en lugar de texto
+            
+        Returns:
+            Contenido del archivo o None si hay error
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        block_size = self.TRANSFER_BLOCK_SIZE
+        start_time = time.monotonic()
+        data = bytearray()
+        blocks = 0
+        retries = 0
+        
+        try:
+            with self._exchange():
+                if not self._enter_raw_repl():
+                    raise RuntimeError("No se pudo entrar en modo raw")
+                try:
+                    size = int(self._raw_exec(self.TRANSFER_HELPER % (filename, 'rb') + "print(_f.seek(0, 2))\n"))
+                    
+                    while len(data) < size:
+                        offset = len(data)
+                        for attempt in range(self.TRANSFER_RETRIES + 1):
+                            line = self._raw_exec(f"_r({offset},{block_size})").decode('ascii').strip()
+                            payload, crc = line.rsplit(' ', 1)
+                            block = base64.b64decode(payload)
+                            if int(crc) == -1 or zlib.crc32(block) == int(crc):
+                                break
+                            retries += 1
+                            logger.warning(f"⚠️  CRC incorrecto en bloque {offset}, reintentando...")
+                        else:
+                            raise RuntimeError(f"CRC incorrecto en bloque {offset}")
+                        if not block:
+                            break
+                        data += block
+                        blocks += 1
+                    
+                    self._raw_exec(self.TRANSFER_CLEANUP)
+                finally:
+                    self._exit_raw_repl()
+            
+            self.last_transfer = TransferStats(filename, len(data), time.monotonic() - start_time, blocks, retries,
+                                               len(data))
+            logger.info(f"Archivo {filename} descargado exitosamente "
+                        f"({len(data)} bytes, {self.last_transfer.bytes_per_second:.0f} B/s)")
+            return bytes(data) if binary else data.decode('utf-8', errors='replace')
+            
+        except Exception as e:
+            logger.error(f"Error descargando archivo {filename}: {e}")
+            return None
+    
+    @classmethod
+    def _hash_local_dir(cls, local: str) -> Dict[str, str]:
+        """
+        Calcular el SHA-256 de los archivos de un directorio local
+        
+        Los hashes se guardan junto con tamaño y mtime en SYNC_CACHE_DIR (un
+        archivo por ruta absoluta del directorio), así solo se vuelven a leer
+        los archivos modificados y el proyecto no se toca.
+        
+        Returns:
+            Diccionario {ruta relativa (con /): sha256 hex}
+        """
+        key = hashlib.sha256(os.path.abspath(local).encode('utf-8')).hexdigest()[:16]
+        cache_path = os.path.join(cls.SYNC_CACHE_DIR, f"{key}.json")
+        try:
+            with open(cache_path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        
+        hashes = {}
+        new_cache = {}
+        for root, dirs, files in os.walk(local):
+            dirs[:] = sorted(d for d in dirs if d not in cls.SYNC_IGNORE)
+            for name in sorted(files):
+                if name in cls.SYNC_IGNORE:
+                    continue
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, local).replace(os.sep, '/')
+                st = os.stat(path)
+                cached = cache.get(rel)
+                if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                    digest = cached[2]
+                else:
+                    sha = hashlib.sha256()
+                    with open(path, 'rb') as f:
+                        for block in iter(lambda: f.read(65536), b''):
+                            sha.update(block)
+                    digest = sha.hexdigest()
+                hashes[rel] = digest
+                new_cache[rel] = [st.st_size, st.st_mtime_ns, digest]
+        
+        if new_cache != cache:
+            try:
+                os.makedirs(cls.SYNC_CACHE_DIR, exist_ok=True)
+                with open(cache_path, 'w') as f:
+                    json.dump(new_cache, f)
+            except OSError as e:
+                logger.debug(f"No se pudo guardar la caché de hashes: {e}")
+        
+        return hashes
+    
+    def remote_hashes(self, remote: str = "/") -> Dict[str, str]:
+        """
+        Obtener el SHA-256 de todos los archivos bajo un directorio del Pico
+        
+        Se calcula en el Pico con hashlib en un solo intercambio.
+        
+        Args:
+            remote: Directorio remoto (default: raíz)
+            
+        Returns:
+            Diccionario {ruta relativa: sha256 hex}
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        with self._exchange():
+            if not self._enter_raw_repl():
+                raise RuntimeError("No se pudo entrar en modo raw")
+            try:
+                output = self._raw_exec(self.HASH_HELPER % remote)
+            finally:
+                self._exit_raw_repl()
+        
+        hashes = {}
+        for line in output.decode('utf-8', errors='ignore').splitlines():
+            if ' ' in line:
+                digest, rel = line.split(' ', 1)
+                hashes[rel] = digest
+        return hashes
+    
+    def sync_dir(self, local: str, remote: str = "/") -> SyncResult:
+        """
+        Sincronizar un directorio local con el Pico subiendo solo lo que cambió
+        
+        🔄 SYNC POR CONTENIDO:
+        - Hashes remotos (SHA-256) en un solo intercambio
+        - Hashes locales con caché por tamaño/mtime
+        - Solo se suben los archivos cuyo hash difiere
+        
+        Args:
+            local: Directorio local
+            remote: Directorio destino en el Pico (default: raíz)
+            
+        Returns:
+            SyncResult con archivos subidos, sin cambios y fallidos
+        """
+        if not self.connected:
+            raise RuntimeError("No conectado al Pico")
+        
+        start_time = time.monotonic()
+        local_hashes = self._hash_local_dir(local)
+        
+        # Con minificación o precompilación se compara lo que quedaría en el Pico
+        sources = {}                   # Ruta remota -> .py local
+        if self.minify or self.precompile:
+            for rel in [r for r in local_hashes if r.endswith('.py')]:
+                with open(os.path.join(local, *rel.split('/')), 'rb') as f:
+                    target, data = self._prepare_upload(rel, f.read(), quiet=True)
+                del local_hashes[rel]
+                local_hashes[target] = hashlib.sha256(data).hexdigest()
+                sources[target] = rel
+        
+        remote_hashes = self.remote_hashes(remote)
+        
+        changed = [rel for rel, digest in local_hashes.items() if remote_hashes.get(rel) != digest]
+        unchanged = [rel for rel in local_hashes if rel not in changed]
+        
+        prefix = remote if remote.endswith('/') or not remote else remote + '/'
+        dirs = set()
+        if changed and remote.rstrip('/'):
+            dirs.add(remote.rstrip('/'))
+        for rel in changed:
+            parts = rel.split('/')[:-1]
+            for i in range(1, len(parts) + 1):
+                dirs.add(prefix + '/'.join(parts[:i]))
+        if dirs:
+            with self._exchange():
+                if self._enter_raw_repl():
+                    try:
+                        self._raw_exec(self.MKDIR_HELPER % sorted(dirs))
+                    finally:
+                        self._exit_raw_repl()
+        
+        uploaded = []
+        failed = []
+        for rel in changed:
+            source = sources.get(rel, rel)
+            with open(os.path.join(local, *source.split('/')), 'rb') as f:
+                content = f.read()
+            if self.upload_file(prefix + source, content):
+                uploaded.append(rel)
+            else:
+                failed.append(rel)
+        
+        result = SyncResult(uploaded, unchanged, failed, time.monotonic() - start_time)
+        logger.info(f"🔄 Sync {local} → {remote}: {len(uploaded)} subido(s), "
+                    f"{len(unchanged)} sin cambios, {len(failed)} fallido(s) ({result.seconds:.2f}s)")
+        return result
+    
+    def _prepare_upload(self, filename: str, data: bytes, quiet: bool = False) -> Tuple[str, bytes]:
+        """
+        Etapas previas a subir un archivo .py: minificación y precompilación
+        
+        Returns:
+            Tupla (nombre remoto, contenido); foo.py pasa a foo.mpy si se compiló
+        """
+        if not filename.endswith('.py'):
+            return filename, data
+        try:
+            source = data.decode('utf-8')
+        except UnicodeDecodeError:
+            return filename, data
+        
+        basename = filename.rsplit('/', 1)[-1]
+        if self.minify:
+            result = minify_source(source, self.minify_names)
+            if not quiet:
+                self.last_minify = result
+                logger.info(f"🗜️  {filename} minificado: {result.original_size} → "
+                            f"{result.minified_size} bytes ({result.saved} ahorrados)")
+            source = result.source
+            data = source.encode('utf-8')
+        if self.precompile and basename not in self.MPY_NO_COMPILE:
+            self._detect_capabilities()
+            compiled = self._compile_mpy(source, basename)
+            if compiled is not None:
+                return filename[:-3] + '.mpy', compiled
+        return filename, data
+    
+    def _detect_capabilities(self):
+        """Consultar al firmware la versión de .mpy y el descompresor (ver _detect_capabilities_steps)"""
+        if self._caps_detected:
+            return
+        with self._exchange():
+            self._run_protocol(self._detect_capabilities_steps())
+    
+    def list_files(self) -> List[str]:
+        """
+        Listar archivos en el Pico
+        
+        Returns:
+            Lista de nombres de archivos
+        """
+        try:
+            # Usar os.listdir() de MicroPython
+            result = self.execute_command("import os; print(os.listdir())")
+            
+            # Parsear resultado
+            if result:
+                # Extraer lista del output
+                lines = result.split('\n')
+                for line in lines:
+                    if '[' in line and ']' in line:
+                        # Parsear lista de Python
+                        import ast
+                        try:
+                            files = ast.literal_eval(line.strip())
+                            return files
+                        except:
+                            pass
+            
+            return []
+            
+        except Exception as e:
+            logger.error(f"Error listando archivos: {e}")
+            return []
+    
+    def __enter__(self):
+        """Context manager entry"""
+        self.connect()
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit"""
+        self.disconnect()
 
-class PicoConnection:
+class AsyncRxBuffer(ByteRing):
     """
-    Clase principal para conectar y comunicarse con Raspberry Pi Pico
-    Implementa el protocolo completo de MicroPython sin dependencia de Thonny
-    Incluye limpieza automática de puertos y manejo de conflictos
+    Buffer de recepción para AsyncPicoConnection (mismo contrato que RxBuffer, con await)
+    
+    La política BLOCK no está disponible: el callback del event loop no puede esperar.
     """
     
-    # Constantes del protocolo MicroPython
-    NORMAL_MODE_CMD = b"\x02"      # Ctrl+B - Entrar en modo normal
-    RAW_MODE_CMD = b"\x01"         # Ctrl+A - Entrar en modo raw
-    INTERRUPT_CMD = b"\x03"        # Ctrl+C - Interrumpir ejecución
-    SOFT_REBOOT_CMD = b"\x04"      # Ctrl+D - Soft reboot
-    PASTE_MODE_CMD = b"\x05"       # Ctrl+E - Entrar en modo paste
-    EOT = b"\x04"                  # End of Transmission
+    def __init__(self, capacity: int = 65536, overflow: str = ByteRing.DROP_OLDEST,
+                 spill_path: Optional[str] = None):
+        if overflow == self.BLOCK:
+            raise ValueError("AsyncRxBuffer no admite la política BLOCK")
+        super().__init__(capacity, overflow, spill_path)
+        self._changed = asyncio.Event()
     
-    @staticmethod
-    def cleanup_ports():
-        """
-        Limpia todos los procesos que puedan estar usando puertos del Pico
-        🔧 CONEXIÓN ROBUSTA: Limpieza agresiva de procesos y puertos
-        
-        Comandos ejecutados en orden:
-        1. Matar procesos Python relacionados con Pico
-        2. Matar procesos Node.js del simulador
-        3. Liberar puerto 20111 (WebSocket)
-        4. Esperar 2 segundos para estabilización
-        
-        ⚠️  NOTA: No usa sudo para evitar prompts de contraseña
-        """
-        logger.info("🧹 Limpiando procesos relacionados con Pico...")
-        
-        # Comandos de limpieza (sin sudo para evitar prompts)
-        commands = [
-            # 1. Matar procesos Python relacionados
-            ['pkill', '-f', 'pico_bridge'],
-            ['pkill', '-f', 'pico_connection_lib'],
-            ['pkill', '-f', 'python.*pico'],
-            ['pkill', '-f', 'python.*bridge'],
-            
-            # 2. Matar procesos Node.js del simulador
-            ['pkill', '-f', 'simulador-openblock-link'],
-            ['pkill', '-f', 'node.*simulador'],
-            ['pkill', '-f', 'node.*test'],
-            ['pkill', '-f', 'start-server'],
-            
-            # 3. Liberar puerto WebSocket 20111
-            ['lsof', '-ti:20111']
-        ]
-        
-        # Ejecutar comandos de limpieza
-        for i, cmd in enumerate(commands):
-            try:
-                if cmd[0] == 'lsof' and len(cmd) > 2:
-                    # Para lsof, obtener PIDs y matarlos individualmente
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
-                    if result.stdout.strip():
-                        pids = result.stdout.strip().split('\n')
-                        for pid in pids:
-                            if pid.isdigit():
-                                try:
-                                    os.kill(int(pid), signal.SIGKILL)
-                                    logger.debug(f"🔪 Proceso {pid} terminado")
-                                except (ProcessLookupError, PermissionError):
-                                    pass
-                else:
-                    # Ejecutar comando normal
-                    subprocess.run(cmd, capture_output=True, timeout=5)
-                    logger.debug(f"Ejecutado comando: {' '.join(cmd)}")
-            except (subprocess.TimeoutExpired, FileNotFoundError, PermissionError):
-                # Ignorar errores de comandos no encontrados o permisos
-                pass
-        
-        # Esperar estabilización
-        time.sleep(2)
-        logger.info("✅ Limpieza de puertos completada")
+    def feed(self, data: bytes):
+        """Agregar datos recibidos (si no caben se aplica la política de desborde)"""
+        self._write(data)
+        self._changed.set()
     
-    @staticmethod
-    def check_port_available(port):
-        """
-        Verifica si un puerto está disponible
-        """
+    def available(self) -> int:
+        """Bytes pendientes de consumir"""
+        return self._available()
+    
+    def clear(self) -> bytes:
+        """Descartar (y devolver) todo lo pendiente"""
+        return self._take(self._available())
+    
+    async def _wait(self, deadline: float) -> bool:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        self._changed.clear()
         try:
-            result = subprocess.run(['lsof', port], capture_output=True, text=True, timeout=5)
-            if result.stdout.strip():
-                logger.warning(f"⚠️  Puerto {port} ocupado por: {result.stdout.strip()}")
-                return False
-            else:
-                logger.info(f"✅ Puerto {port} libre")
-                return True
-        except:
-            return True  # Asumir libre si no se puede verificar
+            await asyncio.wait_for(self._changed.wait(), remaining)
+        except asyncio.TimeoutError:
+            return False
+        return True
     
-    # Prompts de MicroPython
-    NORMAL_PROMPT = b">>> "
-    RAW_PROMPT = b"\r\n>"
-    FIRST_RAW_PROMPT = b"raw REPL; CTRL-B to exit\r\n>"
-    PASTE_MODE_PREFIX = b"=== "
+    async def read_until(self, markers: Tuple[bytes, ...], timeout: float) -> Tuple[bytes, bool]:
+        """Consumir hasta el final del primer marcador encontrado (ver RxBuffer.read_until)"""
+        deadline = time.monotonic() + timeout
+        overlap = max(len(m) for m in markers) - 1
+        searched = 0
+        discarded = self._discarded
+        while True:
+            searched = max(0, searched - (self._discarded - discarded))
+            discarded = self._discarded
+            end = self._find_end(markers, max(0, searched - overlap))
+            if end != -1:
+                return self._take(self._spill_pending + end), True
+            searched = self._size
+            if not await self._wait(deadline):
+                return self.clear(), False
+    
+    async def read_count(self, count: int, timeout: float) -> bytes:
+        """Consumir exactamente `count` bytes (o lo que haya al vencer el deadline)"""
+        deadline = time.monotonic() + timeout
+        while self._available() < count:
+            if not await self._wait(deadline):
+                break
+        return self._take(count)
+
+class AsyncPicoConnection(ReplProtocol):
+    """
+    Conexión asyncio con Raspberry Pi Pico
+    
+    🚀 UN SOLO EVENT LOOP PARA MUCHOS PICOS:
+    - Sin hilos: el puerto se vigila con loop.add_reader() sobre su descriptor
+      y las escrituras esperan con loop.add_writer() (nunca bloquean el loop)
+    - Mismo protocolo que PicoConnection (pasos de ReplProtocol), incluida la
+      preparación de scripts: minify, caché en el Pico y compresión
+    - Salida del script como async iterator con memoria acotada
+    
+    ⚠️  NOTA: Requiere un puerto con descriptor de archivo (Linux/macOS).
     
-    def __init__(self, port: str, baudrate: int = 115200, timeout: float = 5.0):
+    Ejemplo:
+        async with AsyncPicoConnection('/dev/ttyACM0') as pico:
+            print(await pico.exec("print('hola')"))
+    """
+    
+    OUTPUT_QUEUE_SIZE = 256          # Chunks de salida pendientes (se descartan los más viejos)
+    WRITE_TIMEOUT = 10.0             # Espera máxima para vaciar una escritura (como write_timeout)
+    
+    def __init__(self, port: str, baudrate: int = 115200, timeout: float = 5.0,
+                 rx_capacity: int = 65536, rx_overflow: str = ByteRing.DROP_OLDEST,
+                 precompile: bool = False, minify: bool = False, minify_names: bool = False,
+                 compress: bool = True):
         """
         Inicializar conexión con Pico
         
         Args:
             port: Puerto serial (ej: '/dev/cu.usbmodem1301')
             baudrate: Velocidad de comunicación (default: 115200)
-            timeout: Timeout para operaciones (default: 2.0)
+            timeout: Timeout para operaciones (default: 5.0)
+            rx_capacity: Bytes preasignados para respuestas (default: 64KB)
+            rx_overflow: ByteRing.DROP_OLDEST o ByteRing.SPILL
+            precompile, minify, minify_names, compress: Como en PicoConnection
         """
         self.port = port
         self.baudrate = baudrate
@@ -177,94 +3429,52 @@ class PicoConnection:
         self.serial: Optional[serial.Serial] = None
         self.connected = False
         self.current_mode = "unknown"
-        self._output_callback: Optional[Callable[[str], None]] = None
-        self._reading_thread: Optional[threading.Thread] = None
-        self._stop_reading = False
-        
-    @staticmethod
-    def find_pico_ports() -> List[PicoPort]:
-        """
-        Encontrar todos los puertos Pico disponibles
-        
-        Returns:
-            Lista de puertos Pico encontrados
-        """
-        ports = []
-        
-        for port in serial.tools.list_ports.comports():
-            description = (port.description or '').lower()
-            manufacturer = (getattr(port, 'manufacturer', '') or '').lower()
-            
-            # Buscar por descripción
-            if any(keyword in description for keyword in ['micropython', 'pico', 'rp2040', 'usb serial']):
-                ports.append(PicoPort(
-                    device=port.device,
-                    description=port.description,
-                    manufacturer=getattr(port, 'manufacturer', 'Unknown')
-                ))
-            # Buscar por manufacturer
-            elif any(keyword in manufacturer for keyword in ['raspberry', 'pico']):
-                ports.append(PicoPort(
-                    device=port.device,
-                    description=port.description,
-                    manufacturer=getattr(port, 'manufacturer', 'Unknown')
-                ))
-            # Buscar por nombre de dispositivo (macOS/Linux)
-            elif 'usbmodem' in port.device.lower() or 'usbserial' in port.device.lower():
-                ports.append(PicoPort(
-                    device=port.device,
-                    description=port.description,
-                    manufacturer=getattr(port, 'manufacturer', 'Unknown')
-                ))
-        
-        return ports
+        self._raw_paste_supported: Optional[bool] = None
+        self._rx = AsyncRxBuffer(rx_capacity, rx_overflow)
+        self._lock = asyncio.Lock()
+        self.last_transfer: Optional[TransferStats] = None
+        self._script_cache: Optional[OrderedDict] = None
+        self._script_cache_free = 0
+        self.precompile = precompile
+        self.minify = minify
+        self.minify_names = minify_names
+        self.last_minify: Optional[MinifyResult] = None
+        self.mpy_target: Optional[Tuple[int, int, Optional[str]]] = None
+        self.compress = compress
+        self.decompressor: Optional[str] = None
+        self._caps_detected = False
+        self._output: asyncio.Queue = asyncio.Queue(self.OUTPUT_QUEUE_SIZE)
+        self._output_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
     
-    def connect(self, auto_cleanup=True) -> bool:
+    async def connect(self) -> bool:
         """
-        Conectar al Pico
-        
-        Args:
-            auto_cleanup: Si True, limpia puertos automáticamente antes de conectar
+        Conectar al Pico y asegurar modo normal
         
         Returns:
             True si la conexión fue exitosa, False en caso contrario
         """
         try:
-            # Limpieza automática de puertos si está habilitada
-            if auto_cleanup:
-                self.cleanup_ports()
-            
-            # Verificar si el puerto está disponible
-            if not self.check_port_available(self.port):
-                logger.warning(f"Puerto {self.port} ocupado, intentando liberar...")
-                self.cleanup_ports()
-            
-            logger.info(f"Conectando a {self.port}...")
-            
-            # Crear conexión serial
+            logger.info(f"Conectando a {self.port} (asyncio)...")
             self.serial = serial.Serial(
                 port=self.port,
                 baudrate=self.baudrate,
-                timeout=self.timeout,
-                write_timeout=10,  # Aumentado para scripts largos
+                timeout=0,             # Lecturas no bloqueantes: las despierta el event loop
+                write_timeout=10,
                 exclusive=True
             )
+            self.current_mode = "unknown"
+            self._output_decoder.reset()
+            self._script_cache = None
+            self._caps_detected = False
+            # Las escrituras también son no bloqueantes: _write espera con add_writer
+            os.set_blocking(self.serial.fileno(), False)
+            asyncio.get_running_loop().add_reader(self.serial.fileno(), self._on_readable)
             
-            # Esperar a que se estabilice
-            time.sleep(1)
-            
-            # Leer datos iniciales
-            if self.serial.in_waiting > 0:
-                initial_data = self.serial.read_all()
-                logger.info(f"Datos iniciales: {initial_data.decode('utf-8', errors='ignore')[:100]}...")
-            
-            # Iniciar hilo de lectura
-            self._stop_reading = False
-            self._reading_thread = threading.Thread(target=self._read_loop, daemon=True)
-            self._reading_thread.start()
-            
-            # Asegurar modo normal
-            self._ensure_normal_mode()
+            async with self._exchange():
+                if not await self._run_protocol(self._handshake_steps()):
+                    logger.warning("⚠️  El Pico no respondió al handshake")
+                if self.precompile:
+                    await self._run_protocol(self._detect_capabilities_steps())
             
             self.connected = True
             logger.info("✅ Conectado exitosamente al Pico")
@@ -272,245 +3482,133 @@ class PicoConnection:
             
         except Exception as e:
             logger.error(f"❌ Error conectando: {e}")
-            self.connected = False
+            await self.disconnect()
             return False
     
-    def disconnect(self):
+    async def disconnect(self):
         """Desconectar del Pico"""
         if self.serial and self.serial.is_open:
-            self._stop_reading = True
-            if self._reading_thread:
-                self._reading_thread.join(timeout=1)
+            asyncio.get_running_loop().remove_reader(self.serial.fileno())
             self.serial.close()
-            self.connected = False
             logger.info("🔌 Desconectado del Pico")
+        self.connected = False
+        self.current_mode = "unknown"
     
-    @staticmethod
-    def convert_arduino_to_micropython(arduino_code: str) -> str:
-        """
-        Convierte código Arduino a MicroPython para Pico W
-        
-        🔧 CONVERSIÓN AUTOMÁTICA:
-        - Convierte sintaxis Arduino a MicroPython
-        - Genera código optimizado para Pico W
-        - Maneja conversiones de timing y funciones
-        
-        Args:
-            arduino_code: Código Arduino a convertir
-            
-        Returns:
-            Código MicroPython convertido
-        """
-        logger.info("🔄 Convirtiendo código Arduino a MicroPython...")
-        
-        # Limpiar código Arduino
-        micropython_code = arduino_code
-        
-        # Remover includes y comentarios
-        import re
-        micropython_code = re.sub(r'#include\s*<[^>]+>', '', micropython_code)
-        micropython_code = re.sub(r'//.*$', '', micropython_code, flags=re.MULTILINE)
-        
-        # Convertir variables
-        micropython_code = re.sub(r'int\s+(\w+)\s*=\s*LED_BUILTIN', r'\1 = "LED"', micropython_code)
-        micropython_code = re.sub(r'int\s+(\w+)\s*=\s*(\d+)', r'\1 = \2', micropython_code)
-        
-        # Convertir pinMode a Pin object
-        micropython_code = re.sub(r'pinMode\s*\(\s*(\w+)\s*,\s*OUTPUT\s*\)', r'\1 = Pin(\1, Pin.OUT)', micropython_code)
-        micropython_code = re.sub(r'pinMode\s*\(\s*(\w+)\s*,\s*INPUT\s*\)', r'\1 = Pin(\1, Pin.IN)', micropython_code)
-        
-        # Conversiones de funciones
-        conversions = {
-            'void setup()': 'def setup():',
-            'void loop()': 'def loop():',
-            'digitalWrite(': 'led.value(',
-            'digitalRead(': 'pin.read(',
-            'analogWrite(': 'pin.duty(',
-            'analogRead(': 'pin.read_analog(',
-            'delay(': 'time.sleep(',
-            'Serial.print(': 'print(',
-            'Serial.println(': 'print(',
-            'LED_BUILTIN': '"LED"',
-            'true': 'True',
-            'false': 'False',
-            'HIGH': '1',
-            'LOW': '0',
-            ';': '',
-            '{': '',
-            '}': ''
-        }
-        
-        # Aplicar conversiones
-        for arduino, micropython in conversions.items():
-            micropython_code = micropython_code.replace(arduino, micropython)
-        
-        # Generar código MicroPython simple
-        lines = micropython_code.split('\n')
-        result = []
-        led_pin = '"LED"'
-        
-        # Buscar variable LED
-        for line in lines:
-            if 'led = "LED"' in line or 'led = LED_BUILTIN' in line:
-                led_pin = '"LED"'
-                break
-        
-        # Generar código MicroPython
-        result.append('from machine import Pin')
-        result.append('import time')
-        result.append('')
-        result.append(f'led = Pin({led_pin}, Pin.OUT)')
-        result.append('')
-        result.append('while True:')
-        
-        # Convertir contenido del loop
-        in_loop = False
-        for line in lines:
-            trimmed = line.strip()
-            
-            if trimmed.startswith('def loop():'):
-                in_loop = True
-                continue
-            
-            if in_loop and 'led.value(' in trimmed:
-                # Convertir digitalWrite a led.value
-                match = re.match(r'led\.value\(\s*(\w+)\s*,\s*(\d+)\s*\)', trimmed)
-                if match:
-                    result.append(f'    led.value({match.group(2)})')
-                else:
-                    result.append(f'    {trimmed}')
-            elif in_loop and 'time.sleep(' in trimmed:
-                # Convertir delay a time.sleep
-                match = re.match(r'time\.sleep\(\s*(\d+)\s*\)', trimmed)
-                if match:
-                    seconds = int(match.group(1)) / 1000  # Convertir ms a segundos
-                    result.append(f'    time.sleep({seconds})')
-                else:
-                    result.append(f'    {trimmed}')
-            elif in_loop and trimmed.startswith('print('):
-                result.append(f'    {trimmed}')
-        
-        final_code = '\n'.join(result)
-        logger.info(f"✅ Conversión completada ({len(final_code)} caracteres)")
-        
-        return final_code
-    
-    def _read_loop(self):
-        """Hilo de lectura continua de datos del Pico"""
-        while not self._stop_reading and self.serial and self.serial.is_open:
-            try:
-                if self.serial.in_waiting > 0:
-                    data = self.serial.read_all()
-                    decoded_data = data.decode('utf-8', errors='ignore')
-                    
-                    # Llamar callback si está definido
-                    if self._output_callback:
-                        self._output_callback(decoded_data)
-                    
-                    logger.debug(f"Datos recibidos: {decoded_data}")
-                
-                time.sleep(0.01)
-            except Exception as e:
-                logger.error(f"Error en hilo de lectura: {e}")
-                break
-    
-    def set_output_callback(self, callback: Callable[[str], None]):
-        """
-        Establecer callback para recibir salida del Pico
-        
-        Args:
-            callback: Función que recibe la salida como string
-        """
-        self._output_callback = callback
-    
-    def _ensure_normal_mode(self):
-        """Asegurar que estamos en modo normal"""
-        if self.current_mode == "normal":
+    def _on_readable(self):
+        """Callback del event loop: hay datos en el puerto"""
+        try:
+            data = self.serial.read(self.serial.in_waiting or 1)
+        except serial.SerialException as e:
+            logger.error(f"Error leyendo del Pico: {e}")
+            asyncio.get_running_loop().remove_reader(self.serial.fileno())
+            self.connected = False
             return
         
-        logger.info("Asegurando modo normal...")
-        self.serial.write(self.NORMAL_MODE_CMD)
-        time.sleep(0.5)
-        
-        # Leer respuesta
-        if self.serial.in_waiting > 0:
-            response = self.serial.read_all()
-            logger.debug(f"Respuesta modo normal: {response.decode('utf-8', errors='ignore')}")
-        
-        self.current_mode = "normal"
+        if not data:
+            return
+        if self._lock.locked():
+            self._rx.feed(data)
+        else:
+            self._deliver_output(data)
     
-    def _ensure_raw_mode(self):
-        """Asegurar que estamos en modo raw"""
-        if self.current_mode == "raw":
+    def _deliver_output(self, data: bytes):
+        """Encolar salida no solicitada; si nadie la consume se descarta la más vieja"""
+        text = self._output_decoder.decode(data)
+        if not text:
             return
-        
-        logger.info("Asegurando modo raw...")
-        self.serial.write(self.RAW_MODE_CMD)
-        time.sleep(0.5)
-        
-        # Leer respuesta
-        if self.serial.in_waiting > 0:
-            response = self.serial.read_all()
-            logger.debug(f"Respuesta modo raw: {response.decode('utf-8', errors='ignore')}")
-        
-        self.current_mode = "raw"
+        if self._output.full():
+            self._output.get_nowait()
+        self._output.put_nowait(text)
     
-    def execute_command(self, command: str) -> str:
+    @asynccontextmanager
+    async def _exchange(self):
         """
-        Ejecutar comando en modo normal
-        
-        ⚠️ NOTA: Para scripts largos, usar execute_script_paste_mode() es más confiable.
-        Este método es para comandos individuales simples.
+        Intercambio comando/respuesta (ver PicoConnection._exchange)
         
-        Args:
-            command: Comando a ejecutar
-            
-        Returns:
-            Respuesta del Pico
+        A diferencia del de PicoConnection NO es reentrante: asyncio.Lock no
+        sabe qué tarea lo tiene, así que anidar un intercambio en la misma
+        tarea se quedaría esperando para siempre. Cada método público abre uno
+        solo y compone los pasos con yield from (ej: _prepare_script_steps).
+        Mientras el lock está tomado los bytes van al buffer de respuesta.
         """
-        if not self.connected:
-            raise RuntimeError("No conectado al Pico")
-        
-        self._ensure_normal_mode()
-        
-        logger.info(f"Ejecutando comando: {command}")
-        self.serial.write(f"{command}\r\n".encode('utf-8'))
-        time.sleep(0.5)
-        
-        # Leer respuesta
-        if self.serial.in_waiting > 0:
-            response = self.serial.read_all()
-            return response.decode('utf-8', errors='ignore')
-        
-        return ""
+        async with self._lock:
+            self._rx.clear()
+            try:
+                yield
+            finally:
+                leftover = self._rx.clear()
+                if leftover:
+                    self._deliver_output(leftover)
     
-    def execute_script_paste_mode(self, script: str) -> str:
+    async def _write(self, data: bytes) -> int:
         """
-        Ejecutar script usando modo paste (como Thonny)
+        Escribir en el puerto sin bloquear el event loop
         
-        🎯 IMPORTANTE: Este es el método RECOMENDADO para scripts largos.
-        - ✅ Envía el script completo de una vez
-        - ✅ Más confiable que comandos individuales
-        - ✅ Timing correcto sin interrupciones
-        - ✅ Ejecución atómica
-        - ✅ Interrumpe código anterior automáticamente
+        Escribe lo que el driver acepte y espera con loop.add_writer() a que
+        haya lugar para el resto (USB CDC frena al host si el Pico no lee).
         
-        🔧 DETALLES TÉCNICOS:
-        - Usa Ctrl+E para entrar en modo paste
-        - Envía script en chunks de 64 bytes
-        - Timing: 0.05s entre chunks, 2s timeout ejecución
-        - Ctrl+D (EOT) para finalizar y ejecutar
-        - Lee respuesta con timeout de 5 segundos
-        - Interrupción automática del código anterior (Ctrl+C)
+        Raises:
+            serial.SerialTimeoutException: Si no se vació en WRITE_TIMEOUT
+        """
+        loop = asyncio.get_running_loop()
+        fd = self.serial.fileno()
+        view = memoryview(data)
+        deadline = loop.time() + self.WRITE_TIMEOUT
+        while view:
+            try:
+                view = view[os.write(fd, view):]
+                continue
+            except BlockingIOError:
+                pass
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise serial.SerialTimeoutException("Write timeout")
+            writable = loop.create_future()
+            loop.add_writer(fd, lambda: writable.done() or writable.set_result(None))
+            try:
+                await asyncio.wait_for(writable, remaining)
+            except asyncio.TimeoutError:
+                raise serial.SerialTimeoutException("Write timeout")
+            finally:
+                loop.remove_writer(fd)
+        return len(data)
+    
+    async def _run_protocol(self, steps):
+        """Ejecutar pasos del protocolo con await (requiere un intercambio activo)"""
+        value = None
+        try:
+            while True:
+                op = steps.send(value)
+                kind = op[0]
+                if kind == self._OP_WRITE:
+                    value = await self._write(op[1])
+                elif kind == self._OP_READ_UNTIL:
+                    value = await self._rx.read_until(op[1], op[2])
+                elif kind == self._OP_READ_COUNT:
+                    value = await self._rx.read_count(op[1], op[2])
+                elif kind == self._OP_AVAILABLE:
+                    value = self._rx.available()
+                elif kind == self._OP_CALL:
+                    # Trabajo del host (ej: mpy-cross) en un hilo, sin frenar el loop
+                    value = await asyncio.get_running_loop().run_in_executor(None, op[1], *op[2:])
+                else:
+                    value = self._rx.clear()
+        except StopIteration as stop:
+            return stop.value
+    
+    async def exec(self, script: str, timeout: Optional[float] = None, cached: bool = False) -> str:
+        """
+        Ejecutar un script (raw-paste, con fallback a modo paste)
         
-        🚀 PRUEBA EXITOSA CONFIRMADA:
-        - Archivo: test-pico-final.js
-        - Resultado: LED parpadeando correctamente
-        - Método: Script completo en modo paste
-        - Interrupción: Automática del código anterior
+        El script se prepara igual que en PicoConnection.execute_script_raw_paste
+        (minify, caché y compresión, ver _prepare_script_steps).
         
         Args:
             script: Script Python completo a ejecutar
+            timeout: Tiempo máximo de espera de la ejecución (default: EXEC_TIMEOUT)
+            cached: Si True, guardar el script en la caché del Pico (ver
+                _cached_script_steps); con precompile=True siempre se usa
             
         Returns:
             Salida del script
@@ -518,321 +3616,192 @@ class PicoConnection:
         if not self.connected:
             raise RuntimeError("No conectado al Pico")
         
-        logger.info(f"Ejecutando script en modo paste ({len(script)} caracteres)")
-        
-        # 🔥 INTERRUMPIR EJECUCIÓN ANTERIOR - CRÍTICO PARA NUEVO CÓDIGO
-        logger.info("🛑 Interrumpiendo ejecución anterior...")
-        self.serial.write(self.INTERRUPT_CMD)  # Ctrl+C
-        time.sleep(0.5)
-        
-        # Limpiar buffer de entrada
-        if self.serial.in_waiting > 0:
-            self.serial.read_all()
-        
-        # Asegurar modo normal
-        self._ensure_normal_mode()
-        
-        # Entrar en modo paste
-        self.serial.write(self.PASTE_MODE_CMD)
-        time.sleep(0.5)
-        
-        # Leer confirmación
-        if self.serial.in_waiting > 0:
-            response = self.serial.read_all()
-            logger.debug(f"Respuesta modo paste: {response.decode('utf-8', errors='ignore')}")
-        
-        # Enviar script en chunks para evitar timeout
-        script_bytes = script.encode('utf-8')
-        chunk_size = 64  # Enviar en chunks pequeños
+        if timeout is None:
+            timeout = self.EXEC_TIMEOUT
         
-        for i in range(0, len(script_bytes), chunk_size):
-            chunk = script_bytes[i:i + chunk_size]
-            self.serial.write(chunk)
-            time.sleep(0.05)  # Pequeña pausa entre chunks
-        
-        # Enviar EOT para ejecutar
-        self.serial.write(self.EOT)
-        time.sleep(2)  # Más tiempo para que se ejecute
-        
-        # Leer respuesta con timeout más largo
-        response = b""
-        start_time = time.time()
-        timeout = 5.0
-        
-        while time.time() - start_time < timeout:
-            if self.serial.in_waiting > 0:
-                response += self.serial.read_all()
-            time.sleep(0.1)
-        
-        if response:
-            return response.decode('utf-8', errors='ignore')
-        
-        return ""
+        logger.info(f"Ejecutando script en modo raw-paste ({len(script)} caracteres)")
+        async with self._exchange():
+            script = await self._run_protocol(self._prepare_script_steps(script, cached))
+            result = await self._run_protocol(self._raw_paste_script_steps(script, timeout))
+            if result is None:
+                logger.warning("⚠️  Modo raw no disponible, usando modo paste")
+                result = await self._run_protocol(self._paste_steps(script, timeout))
+        return result
     
-    def execute_script_raw_mode(self, script: str) -> str:
+    async def interrupt(self, max_level: str = ReplProtocol.STOP_SOFT_REBOOT) -> InterruptResult:
         """
-        Ejecutar script usando modo raw
+        Detener el script en ejecución (ver PicoConnection.interrupt_execution)
         
-        Args:
-            script: Script Python a ejecutar
-            
         Returns:
-            Salida del script
+            InterruptResult con el nivel que hizo falta y el tiempo empleado
         """
         if not self.connected:
             raise RuntimeError("No conectado al Pico")
         
-        logger.info(f"Ejecutando script en modo raw ({len(script)} caracteres)")
-        
-        # Asegurar modo raw
-        self._ensure_raw_mode()
-        
-        # Enviar script con EOT
-        script_bytes = script.encode('utf-8') + self.EOT
-        self.serial.write(script_bytes)
-        time.sleep(1)
-        
-        # Leer respuesta
-        if self.serial.in_waiting > 0:
-            response = self.serial.read_all()
-            return response.decode('utf-8', errors='ignore')
-        
-        return ""
+        async with self._exchange():
+            return await self._run_protocol(self._stop_steps(max_level))
     
-    def interrupt_execution(self):
-        """Interrumpir ejecución actual - MÉTODO MEJORADO"""
-        if not self.connected:
-            raise RuntimeError("No conectado al Pico")
-        
-        logger.info("Interrumpiendo ejecución...")
-        
-        # Enviar múltiples Ctrl+C para asegurar interrupción
-        for i in range(5):
-            self.serial.write(self.INTERRUPT_CMD)
-            time.sleep(0.05)
-        
-        # Limpiar buffer de entrada
-        if self.serial.in_waiting > 0:
-            self.serial.read_all()
-        
-        # Enviar Ctrl+D para salir del bucle si está en modo paste
-        self.serial.write(self.SOFT_REBOOT_CMD)
-        time.sleep(0.3)
-        
-        # Enviar más Ctrl+C
-        for i in range(3):
-            self.serial.write(self.INTERRUPT_CMD)
-            time.sleep(0.1)
-        
-        # Limpiar buffer nuevamente
-        if self.serial.in_waiting > 0:
-            self.serial.read_all()
-        
-        # Intentar apagar LED directamente
-        try:
-            self.serial.write(b"led.value(0)\r\n")
-            time.sleep(0.1)
-        except:
-            pass
+    async def stream_output(self):
+        """
+        Iterar la salida del script en ejecución a medida que llega
         
-        logger.info("Ejecución interrumpida exitosamente")
+        Ejemplo:
+            async for chunk in pico.stream_output():
+                print(chunk, end='')
+        """
+        while self.connected or not self._output.empty():
+            try:
+                yield await asyncio.wait_for(self._output.get(), self.timeout)
+            except asyncio.TimeoutError:
+                continue
     
-    def force_interrupt_execution(self):
-        """Forzar interrupción de ejecución - MÉTODO MUY AGRESIVO"""
-        if not self.connected:
-            raise RuntimeError("No conectado al Pico")
-        
-        logger.info("Forzando interrupción de ejecución...")
-        
-        # Método 1: Múltiples Ctrl+C muy rápidos
-        for i in range(10):
-            self.serial.write(self.INTERRUPT_CMD)
-            time.sleep(0.01)
-        
-        # Método 2: Ctrl+D para soft reboot
-        self.serial.write(self.SOFT_REBOOT_CMD)
-        time.sleep(0.3)
-        
-        # Método 3: Más Ctrl+C
-        for i in range(5):
-            self.serial.write(self.INTERRUPT_CMD)
-            time.sleep(0.05)
-        
-        # Método 4: Limpiar buffer
-        if self.serial.in_waiting > 0:
-            self.serial.read_all()
-        
-        # Método 5: Salir del modo paste
-        self.serial.write(self.NORMAL_MODE_CMD)
-        time.sleep(0.2)
-        
-        # Método 6: Enviar Ctrl+C final
-        for i in range(3):
-            self.serial.write(self.INTERRUPT_CMD)
-            time.sleep(0.1)
-        
-        # Método 7: Limpiar buffer final
-        if self.serial.in_waiting > 0:
-            self.serial.read_all()
-        
-        # Método 8: Enviar comando para apagar LED
-        try:
-            self.serial.write(b"led.value(0)\r\n")
-            time.sleep(0.1)
-        except:
-            pass
-        
-        logger.info("Interrupción forzada completada")
+    def rx_stats(self) -> BufferStats:
+        """Métricas del buffer de respuestas (ocupación máxima, bytes perdidos, etc.)"""
+        return self._rx.stats()
     
-    def execute_new_code_with_interrupt(self, script: str) -> str:
+    async def __aenter__(self):
+        """Async context manager entry"""
+        if not await self.connect():
+            raise RuntimeError(f"No se pudo conectar al puerto {self.port}")
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit"""
+        await self.disconnect()
+
+class PicoFleet:
+    """
+    Ejecución en paralelo sobre varios Picos
+    
+    🚀 DEPLOY MASIVO:
+    - Conecta a todas las placas a la vez (hasta max_workers en paralelo)
+    - exec/deploy corren en paralelo: el tiempo total ≈ el de una placa
+    - Resultado y tiempos por placa (FleetResult); un fallo no frena al resto
+    
+    Ejemplo:
+        with PicoFleet(find_pico_ports(), max_workers=16) as fleet:
+            for r in fleet.exec(script):
+                print(r.port, r.ok, r.seconds)
+    """
+    
+    DEFAULT_MAX_WORKERS = 8
+    
+    def __init__(self, ports: Optional[List[Union[PicoPort, str]]] = None,
+                 max_workers: int = DEFAULT_MAX_WORKERS, auto_cleanup: bool = False):
         """
-        Ejecutar nuevo código con interrupción automática del anterior
-        
-        🎯 MÉTODO MEJORADO: Combina interrupción + ejecución en un solo paso
-        - ✅ Interrumpe código anterior automáticamente
-        - ✅ Limpia buffer completamente
-        - ✅ Ejecuta nuevo código inmediatamente
-        - ✅ Manejo robusto de conflictos
+        Inicializar flota
         
         Args:
-            script: Script Python completo a ejecutar
-            
-        Returns:
-            Salida del script
+            ports: Puertos (PicoPort o nombre de dispositivo); default: find_pico_ports()
+            max_workers: Máximo de placas atendidas en paralelo
+            auto_cleanup: Liberar cada puerto (cleanup_ports) antes de conectar
         """
-        if not self.connected:
-            raise RuntimeError("No conectado al Pico")
-        
-        logger.info(f"🔄 Ejecutando nuevo código con interrupción ({len(script)} caracteres)")
-        
-        # Paso 1: Interrupción agresiva del código anterior
-        logger.info("🛑 Interrumpiendo código anterior...")
-        for i in range(5):
-            self.serial.write(self.INTERRUPT_CMD)
-            time.sleep(0.1)
-        
-        # Paso 2: Soft reboot para limpiar estado
-        self.serial.write(self.SOFT_REBOOT_CMD)
-        time.sleep(0.5)
-        
-        # Paso 3: Limpiar buffer completamente
-        if self.serial.in_waiting > 0:
-            self.serial.read_all()
-        
-        # Paso 4: Asegurar modo normal
-        self._ensure_normal_mode()
-        
-        # Paso 5: Ejecutar nuevo código usando modo paste
-        return self.execute_script_paste_mode(script)
+        if ports is None:
+            ports = PicoConnection.find_pico_ports()
+        self.ports = [p.device if isinstance(p, PicoPort) else p for p in ports]
+        self.max_workers = max(1, max_workers)
+        self.auto_cleanup = auto_cleanup
+        self.connections: Dict[str, PicoConnection] = {}
+        self._connect_seconds: Dict[str, float] = {}
     
-    def soft_reboot(self):
-        """Realizar soft reboot del Pico"""
-        if not self.connected:
-            raise RuntimeError("No conectado al Pico")
-        
-        logger.info("Realizando soft reboot...")
-        self.serial.write(self.SOFT_REBOOT_CMD)
-        time.sleep(1)
+    def _map(self, ports: List[str], operation: Callable[[str], FleetResult]) -> List[FleetResult]:
+        """Aplicar operation a cada puerto con el límite de concurrencia"""
+        if not ports:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(ports))) as executor:
+            return list(executor.map(operation, ports))
+    
+    def _connect_one(self, port: str) -> FleetResult:
+        start_time = time.monotonic()
+        connection = PicoConnection(port)
+        ok = connection.connect(auto_cleanup=self.auto_cleanup)
+        seconds = time.monotonic() - start_time
+        self._connect_seconds[port] = seconds
+        if not ok:
+            return FleetResult(port, False, error="No se pudo conectar", connect_seconds=seconds)
+        self.connections[port] = connection
+        return FleetResult(port, True, connect_seconds=seconds)
+    
+    def connect(self) -> List[FleetResult]:
+        """
+        Conectar a todas las placas en paralelo
         
-        # Leer respuesta
-        if self.serial.in_waiting > 0:
-            response = self.serial.read_all()
-            logger.debug(f"Respuesta soft reboot: {response.decode('utf-8', errors='ignore')}")
+        Returns:
+            Lista de FleetResult (uno por puerto, en el orden de self.ports)
+        """
+        pending = [p for p in self.ports if p not in self.connections]
+        start_time = time.monotonic()
+        results = self._map(pending, self._connect_one)
+        connected = sum(1 for r in results if r.ok)
+        logger.info(f"🔌 Flota: {connected}/{len(results)} placas conectadas en {time.monotonic() - start_time:.2f}s")
+        return results
     
-    def upload_file(self, filename: str, content: str) -> bool:
+    def run(self, operation: Callable[[PicoConnection], object]) -> List[FleetResult]:
         """
-        Subir archivo al Pico
+        Ejecutar operation(conexión) en todas las placas en paralelo
+        
+        Las placas que aún no están conectadas se conectan dentro del mismo
+        worker, así conexión y ejecución se solapan entre placas.
         
         Args:
-            filename: Nombre del archivo
-            content: Contenido del archivo
+            operation: Función que recibe la PicoConnection de una placa
             
         Returns:
-            True si fue exitoso, False en caso contrario
+            Lista de FleetResult (uno por puerto, en el orden de self.ports)
         """
-        try:
-            # Crear archivo usando comandos de MicroPython
-            lines = content.split('\n')
-            
-            # Abrir archivo para escritura
-            self.execute_command(f"f = open('{filename}', 'w')")
-            
-            # Escribir cada línea
-            for line in lines:
-                if line.strip():  # Solo líneas no vacías
-                    escaped_line = line.replace('"', '\\"')
-                    self.execute_command(f'f.write("{escaped_line}\\n")')
-            
-            # Cerrar archivo
-            self.execute_command("f.close()")
-            
-            logger.info(f"Archivo {filename} subido exitosamente")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error subiendo archivo {filename}: {e}")
-            return False
+        def run_one(port: str) -> FleetResult:
+            if port not in self.connections:
+                connected = self._connect_one(port)
+                if not connected.ok:
+                    return connected
+            connect_seconds = self._connect_seconds.get(port, 0.0)
+            start_time = time.monotonic()
+            try:
+                result = operation(self.connections[port])
+                return FleetResult(port, True, result, connect_seconds=connect_seconds,
+                                   seconds=time.monotonic() - start_time)
+            except Exception as e:
+                logger.error(f"❌ {port}: {e}")
+                return FleetResult(port, False, error=str(e), connect_seconds=connect_seconds,
+                                   seconds=time.monotonic() - start_time)
+        
+        start_time = time.monotonic()
+        results = self._map(self.ports, run_one)
+        ok = sum(1 for r in results if r.ok)
+        logger.info(f"✅ Flota: {ok}/{len(results)} placas OK en {time.monotonic() - start_time:.2f}s")
+        return results
     
-    def download_file(self, filename: str) -> Optional[str]:
+    def exec(self, script: str, timeout: Optional[float] = None) -> List[FleetResult]:
         """
-        Descargar archivo del Pico
+        Ejecutar el mismo script en todas las placas (raw-paste con fallback)
         
-        Args:
-            filename: Nombre del archivo
-            
         Returns:
-            Contenido del archivo o None si hay error
+            FleetResult por placa; result es la salida del script
         """
-        try:
-            # Leer archivo línea por línea
-            self.execute_command(f"f = open('{filename}', 'r')")
-            content = ""
-            
-            while True:
-                line = self.execute_command("f.readline()")
-                if not line or line.strip() == "''":
-                    break
-                content += line.strip("'\"") + "\n"
-            
-            self.execute_command("f.close()")
-            
-            logger.info(f"Archivo {filename} descargado exitosamente")
-            return content
-            
-        except Exception as e:
-            logger.error(f"Error descargando archivo {filename}: {e}")
-            return None
+        return self.run(lambda pico: pico.execute_script_raw_paste(script, timeout))
     
-    def list_files(self) -> List[str]:
+    def deploy(self, local: str, remote: str = "/") -> List[FleetResult]:
         """
-        Listar archivos en el Pico
+        Sincronizar un directorio local en todas las placas (solo archivos cambiados)
         
         Returns:
-            Lista de nombres de archivos
+            FleetResult por placa; result es el SyncResult de la placa
         """
-        try:
-            # Usar os.listdir() de MicroPython
-            result = self.execute_command("import os; print(os.listdir())")
-            
-            # Parsear resultado
-            if result:
-                # Extraer lista del output
-                lines = result.split('\n')
-                for line in lines:
-                    if '[' in line and ']' in line:
-                        # Parsear lista de Python
-                        import ast
-                        try:
-                            files = ast.literal_eval(line.strip())
-                            return files
-                        except:
-                            pass
-            
-            return []
-            
-        except Exception as e:
-            logger.error(f"Error listando archivos: {e}")
-            return []
+        def sync(pico: PicoConnection) -> SyncResult:
+            result = pico.sync_dir(local, remote)
+            if result.failed:
+                raise RuntimeError(f"Fallaron {len(result.failed)} archivo(s): {', '.join(result.failed)}")
+            return result
+        # Calentar la caché de hashes una vez: así las placas solo la leen
+        PicoConnection._hash_local_dir(local)
+        return self.run(sync)
+    
+    def disconnect(self):
+        """Desconectar todas las placas"""
+        for connection in self.connections.values():
+            connection.disconnect()
+        self.connections.clear()
+        self._connect_seconds.clear()
     
     def __enter__(self):
         """Context manager entry"""
@@ -843,10 +3812,193 @@ class PicoConnection:
         """Context manager exit"""
         self.disconnect()
 
+class PortWatcher:
+    """
+    Tabla de puertos Pico en caché, actualizada por eventos hotplug
+    
+    🔌 DESCUBRIMIENTO SIN SONDEO:
+    - Se enumera una vez al arrancar; luego solo ante eventos
+    - Fuente de eventos: udev (pyudev, si está instalado), inotify sobre /dev
+      (Linux) o, si no hay ninguno, sondeo cada POLL_INTERVAL segundos
+    - ports() no toca el sistema: devuelve la tabla en memoria
+    - subscribe(callback) avisa de placas conectadas y desconectadas
+    
+    Ejemplo:
+        watcher = get_port_watcher()
+        watcher.subscribe(lambda added, removed: print(added, removed))
+    """
+    
+    POLL_INTERVAL = 1.0            # Sondeo cuando no hay eventos hotplug
+    SETTLE_DELAY = 0.05            # Agrupar ráfagas de eventos (udev crea varios nodos)
+    
+    # Constantes de inotify (linux/inotify.h)
+    _IN_ATTRIB = 0x004
+    _IN_MOVED_FROM = 0x040
+    _IN_MOVED_TO = 0x080
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    
+    def __init__(self, poll_interval: Optional[float] = None):
+        self.poll_interval = poll_interval if poll_interval is not None else self.POLL_INTERVAL
+        self.source = "none"
+        self._ports: Dict[str, PicoPort] = {}
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[List[PicoPort], List[PicoPort]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+    
+    def start(self) -> 'PortWatcher':
+        """Hacer la primera enumeración y arrancar el hilo de eventos"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch_loop, daemon=True)
+            self._thread.start()
+        self._ready.wait()
+        return self
+    
+    def stop(self):
+        """Detener el hilo de eventos"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._thread = None
+        self._ready.clear()
+    
+    def ports(self) -> List[PicoPort]:
+        """Puertos Pico conocidos (desde la caché)"""
+        if not self._ready.is_set():
+            self.start()
+        with self._lock:
+            return list(self._ports.values())
+    
+    def subscribe(self, callback: Callable[[List[PicoPort], List[PicoPort]], None]) -> Callable[[], None]:
+        """
+        Registrar un callback de cambios: callback(agregados, quitados)
+        
+        Returns:
+            Función para cancelar la suscripción
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+        
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+    
+    def refresh(self) -> List[PicoPort]:
+        """Volver a enumerar y notificar diferencias"""
+        current = {p.device: p for p in PicoConnection.find_pico_ports()}
+        with self._lock:
+            added = [p for d, p in current.items() if d not in self._ports]
+            removed = [p for d, p in self._ports.items() if d not in current]
+            self._ports = current
+            subscribers = list(self._subscribers)
+        
+        if added or removed:
+            for port in added:
+                logger.info(f"🔌 Pico conectado: {port.device}")
+            for port in removed:
+                logger.info(f"🔌 Pico desconectado: {port.device}")
+            for callback in subscribers:
+                try:
+                    callback(added, removed)
+                except Exception as e:
+                    logger.error(f"Error en callback de puertos: {e}")
+        return list(current.values())
+    
+    def _open_events(self) -> Optional[Tuple[int, Callable[[], None], Callable[[], None]]]:
+        """Abrir una fuente de eventos hotplug: (fd, vaciar, cerrar) o None"""
+        if pyudev is not None:
+            try:
+                monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                monitor.filter_by('tty')
+                monitor.start()
+                self.source = "udev"
+                
+                def drain():
+                    while monitor.poll(timeout=0) is not None:
+                        pass
+                return monitor.fileno(), drain, lambda: None
+            except Exception as e:
+                logger.debug(f"udev no disponible: {e}")
+        
+        if os.path.isdir('/dev') and hasattr(ctypes, 'CDLL'):
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+                fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+                if fd < 0:
+                    raise OSError(ctypes.get_errno(), "inotify_init1")
+                mask = (self._IN_CREATE | self._IN_DELETE | self._IN_ATTRIB |
+                        self._IN_MOVED_FROM | self._IN_MOVED_TO)
+                if libc.inotify_add_watch(fd, b'/dev', mask) < 0:
+                    os.close(fd)
+                    raise OSError(ctypes.get_errno(), "inotify_add_watch")
+                self.source = "inotify"
+                
+                def drain():
+                    try:
+                        while os.read(fd, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                return fd, drain, lambda: os.close(fd)
+            except (OSError, AttributeError) as e:
+                logger.debug(f"inotify no disponible: {e}")
+        
+        self.source = "poll"
+        return None
+    
+    def _watch_loop(self):
+        """Hilo de eventos: re-enumerar solo cuando cambia /dev"""
+        events = self._open_events()
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Error enumerando puertos: {e}")
+        self._ready.set()
+        
+        try:
+            while not self._stop.is_set():
+                if events is None:
+                    self._stop.wait(self.poll_interval)
+                else:
+                    fd, drain, _ = events
+                    readable, _, _ = select.select([fd], [], [], 0.5)
+                    if not readable:
+                        continue
+                    # Esperar a que termine la ráfaga de eventos del dispositivo
+                    self._stop.wait(self.SETTLE_DELAY)
+                    drain()
+                if not self._stop.is_set():
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        logger.error(f"Error enumerando puertos: {e}")
+        finally:
+            if events is not None:
+                events[2]()
+
 # Funciones de conveniencia
-def find_pico_ports() -> List[PicoPort]:
-    """Encontrar puertos Pico disponibles"""
-    return PicoConnection.find_pico_ports()
+_port_watcher: Optional[PortWatcher] = None
+_port_watcher_lock = threading.Lock()
+
+def get_port_watcher() -> PortWatcher:
+    """Obtener (y arrancar la primera vez) el PortWatcher compartido"""
+    global _port_watcher
+    with _port_watcher_lock:
+        if _port_watcher is None:
+            _port_watcher = PortWatcher()
+        watcher = _port_watcher
+    return watcher.start()
+
+def find_pico_ports(cached: bool = False, probe: bool = False) -> List[PicoPort]:
+    """Encontrar puertos Pico disponibles (cached=True: desde PortWatcher)"""
+    return PicoConnection.find_pico_ports(cached, probe)
 
 def connect_to_pico(port: str) -> PicoConnection:
     """Conectar a un puerto Pico específico"""
@@ -983,10 +4135,9 @@ print("Script completado!")
 # 🔧 DETALLES TÉCNICOS DE CONEXIÓN ROBUSTA:
 #
 # 1. LIMPIEZA DE PUERTOS:
-#    - Matar procesos Python relacionados con Pico
-#    - Matar procesos Node.js del simulador
-#    - Liberar puerto WebSocket 20111
-#    - Esperar 2 segundos para estabilización
+#    - Buscar en /proc/*/fd (o lsof en macOS) quién tiene abierto el puerto
+#    - Terminar solo esos procesos (SIGTERM, luego SIGKILL)
+#    - Retornar en cuanto el puerto queda libre (sin espera fija)
 #
 # 2. DETECCIÓN DE PUERTOS:
 #    - Buscar puertos USB (usbmodem, ttyACM)
@@ -1001,8 +4152,8 @@ print("Script completado!")
 #
 # 4. EJECUCIÓN DE CÓDIGO:
 #    - Usar modo paste (Ctrl+E) para scripts largos
-#    - Enviar en chunks de 64 bytes
-#    - Timing: 0.05s entre chunks, 2s timeout ejecución
+#    - Enviar en chunks de 64 bytes, esperando el eco de cada chunk
+#    - Timing guiado por prompts ("=== ", ">>> ") con deadlines como cota
 #    - Ctrl+D (EOT) para finalizar y ejecutar
 #
 # 5. MANEJO DE ERRORES:
@@ -1120,10 +4271,10 @@ print("Script completado!")
 #    - Indentación correcta para MicroPython
 #
 # TIMING Y CONFIGURACIÓN:
-# - Chunk size: 64 bytes para envío
-# - Delay entre chunks: 0.05 segundos
-# - Timeout de ejecución: 2 segundos
-# - Timeout de lectura: 5 segundos
+# - Chunk size: 64 bytes para envío (PASTE_CHUNK_SIZE)
+# - Espera máxima del eco por chunk: 0.05 segundos (PASTE_CHUNK_TIMEOUT)
+# - Espera máxima de prompts: 0.5 segundos (PROMPT_TIMEOUT)
+# - Espera máxima de ejecución: 7 segundos (EXEC_TIMEOUT)
 #
 # MANEJO DE ERRORES:
 # - Captura errores de sintaxis
@@ -12,6 +12,7 @@ const url = require('url');
 const { spawn } = require('child_process');
 const fs = require('fs');
 const path = require('path');
+const { tryBridgeDaemon } = require('./src/lib/bridge-daemon');
 
 // Configuración del servidor
 const PORT = 20111;
@@ -22,6 +23,7 @@ const PICO_CONNECTION_LIB = path.join(__dirname, 'pico_connection_lib.py');
 const PICO_BRIDGE = path.join(__dirname, 'pico_bridge.py');
 let picoConnection = null;
 let picoProcess = null;
+let picoDaemonPort = null;     // Puerto abierto en el daemon (sin proceso propio)
 
 // Dispositivos simulados disponibles
 const SIMULATED_DEVICES = {
@@ -97,6 +99,12 @@ function log(message, color = 'reset') {
 
 // Funciones para manejar conexión real al Pico
 async function findPicoPorts() {
+    const response = await tryBridgeDaemon({ command: 'find_ports' });
+    if (response) {
+        log(`🔍 Encontrados ${response.ports.length} puerto(s) Pico (daemon)`, 'green');
+        return response.ports;
+    }
+
     return new Promise((resolve, reject) => {
         const python = spawn('python3', [PICO_BRIDGE, '--find-ports'], {
             stdio: ['pipe', 'pipe', 'pipe']
@@ -151,6 +159,18 @@ async function findPicoPorts() {
     });
 }
 
+// Soltar el Pico real: matar el proceso propio; la conexión del daemon queda
+// abierta para la próxima vez
+function releasePico() {
+    if (picoProcess) {
+        picoProcess.kill();
+    }
+    picoConnection = null;
+    picoProcess = null;
+    picoDaemonPort = null;
+    log(`🔌 Pico real desconectado`, 'yellow');
+}
+
 async function connectToPico(port) {
     return new Promise((resolve, reject) => {
         log(`🔌 Conectando a Pico en puerto ${port}...`, 'cyan');
@@ -194,6 +214,15 @@ async function connectToPico(port) {
 }
 
 async function executePicoCode(code) {
+    if (picoDaemonPort) {
+        log(`🚀 Ejecutando código en Pico real (daemon)...`, 'yellow');
+        const response = await tryBridgeDaemon({ command: 'execute_code', port: picoDaemonPort, code });
+        if (!response) {
+            throw new Error('El daemon del puente ya no está corriendo');
+        }
+        return response.result || '';
+    }
+
     return new Promise((resolve, reject) => {
         if (!picoProcess) {
             reject(new Error('Pico no está conectado'));
@@ -392,28 +421,39 @@ async function handleConnectDevice(clientId, message) {
         // Manejar conexión real al Pico
         if (deviceId === 'raspberry-pico' && device.status === 'available') {
             try {
-                picoProcess = await connectToPico(device.port);
-                picoConnection = picoProcess;
-                
-                // Configurar manejo de salida del Pico
-                picoProcess.stdout.on('data', (data) => {
-                    const output = data.toString().trim();
-                    if (output && !output.includes('Conectando') && !output.includes('Conectado')) {
-                        // Enviar salida a todos los clientes conectados al Pico
-                        activeConnections.forEach((conn, id) => {
-                            if (conn.devices.has('raspberry-pico')) {
-                                conn.ws.send(JSON.stringify({
-                                    type: 'picoOutput',
-                                    deviceId: 'raspberry-pico',
-                                    output: output,
-                                    timestamp: new Date().toISOString()
-                                }));
-                            }
-                        });
-                    }
+                // Con el daemon corriendo la conexión es suya (persistente)
+                const response = await tryBridgeDaemon({
+                    command: 'connect',
+                    port: device.port === 'auto-detect' ? undefined : device.port
                 });
+                if (response) {
+                    picoDaemonPort = response.port;
+                    picoConnection = { daemon: true, port: response.port };
+                    log(`✅ Pico real conectado en ${response.port} (daemon)`, 'green');
+                } else {
+                    picoProcess = await connectToPico(device.port);
+                    picoConnection = picoProcess;
+
+                    // Configurar manejo de salida del Pico
+                    picoProcess.stdout.on('data', (data) => {
+                        const output = data.toString().trim();
+                        if (output && !output.includes('Conectando') && !output.includes('Conectado')) {
+                            // Enviar salida a todos los clientes conectados al Pico
+                            activeConnections.forEach((conn, id) => {
+                                if (conn.devices.has('raspberry-pico')) {
+                                    conn.ws.send(JSON.stringify({
+                                        type: 'picoOutput',
+                                        deviceId: 'raspberry-pico',
+                                        output: output,
+                                        timestamp: new Date().toISOString()
+                                    }));
+                                }
+                            });
+                        }
+                    });
 
-                log(`✅ Pico real conectado en ${device.port}`, 'green');
+                    log(`✅ Pico real conectado en ${device.port}`, 'green');
+                }
             } catch (error) {
                 log(`❌ Error conectando Pico real: ${error.message}`, 'red');
                 connection.ws.send(JSON.stringify({
@@ -472,10 +512,7 @@ function handleDisconnectDevice(clientId, message) {
 
     // Desconectar Pico real si es necesario
     if (deviceId === 'raspberry-pico' && picoConnection) {
-        picoProcess.kill();
-        picoConnection = null;
-        picoProcess = null;
-        log(`🔌 Pico real desconectado`, 'yellow');
+        releasePico();
     }
 
     connection.devices.delete(deviceId);
@@ -903,10 +940,7 @@ process.on('SIGINT', () => {
     
     // Cerrar conexión Pico real
     if (picoConnection) {
-        picoProcess.kill();
-        picoConnection = null;
-        picoProcess = null;
-        log(`🔌 Pico real desconectado`, 'yellow');
+        releasePico();
     }
     
     // Cerrar todas las conexiones
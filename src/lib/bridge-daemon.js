@@ -0,0 +1,73 @@
+const net = require('net');
+
+// Persistent bridge daemon started with `python3 pico_bridge.py --daemon`
+const PICO_BRIDGE_DAEMON_HOST = '127.0.0.1';
+const PICO_BRIDGE_DAEMON_PORT = 20112;
+const PICO_BRIDGE_DAEMON_TIMEOUT = 15000;
+// Socket errors meaning no daemon is listening (only then spawn pico_bridge.py)
+const PICO_BRIDGE_DAEMON_DOWN = ['ECONNREFUSED', 'ENOENT'];
+
+/**
+ * Send one JSON request to the persistent bridge daemon.
+ * Rejects if the daemon is not running (error.code in PICO_BRIDGE_DAEMON_DOWN) so callers
+ * can fall back to spawning pico_bridge.py; any other rejection means the daemon is alive.
+ * @param {object} request - request object, e.g. {command: 'execute_code', code}
+ * @returns {Promise<object>} daemon response
+ */
+const requestBridgeDaemon = function (request) {
+    return new Promise((resolve, reject) => {
+        const socket = net.createConnection(PICO_BRIDGE_DAEMON_PORT, PICO_BRIDGE_DAEMON_HOST);
+        let buffer = '';
+
+        socket.setTimeout(PICO_BRIDGE_DAEMON_TIMEOUT, () => {
+            socket.destroy();
+            reject(new Error('Bridge daemon timeout'));
+        });
+        socket.on('connect', () => socket.write(`${JSON.stringify(request)}\n`));
+        socket.on('data', data => {
+            buffer += data.toString();
+            const newline = buffer.indexOf('\n');
+            if (newline !== -1) {
+                socket.end();
+                try {
+                    resolve(JSON.parse(buffer.slice(0, newline)));
+                } catch (error) {
+                    reject(error);
+                }
+            }
+        });
+        socket.on('error', reject);
+    });
+};
+
+/**
+ * Send one request to the bridge daemon if it is running.
+ * Once the daemon answers it owns the port, so a failed request rejects instead of
+ * returning null: callers must not open the port from another process.
+ * @param {object} request - request object, e.g. {command: 'find_ports'}
+ * @returns {Promise<?object>} successful daemon response, or null if no daemon is listening
+ */
+const tryBridgeDaemon = async function (request) {
+    let response;
+    try {
+        response = await requestBridgeDaemon(request);
+    } catch (error) {
+        if (PICO_BRIDGE_DAEMON_DOWN.includes(error.code)) {
+            return null;
+        }
+        throw error;
+    }
+    if (!response.ok) {
+        throw new Error(response.error || 'Bridge daemon error');
+    }
+    return response;
+};
+
+module.exports = {
+    PICO_BRIDGE_DAEMON_HOST,
+    PICO_BRIDGE_DAEMON_PORT,
+    PICO_BRIDGE_DAEMON_TIMEOUT,
+    PICO_BRIDGE_DAEMON_DOWN,
+    requestBridgeDaemon,
+    tryBridgeDaemon
+};
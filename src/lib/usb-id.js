@@ -57,6 +57,10 @@ const usbId = {
     'USB\\VID_2E8A&PID_F10F': 'Raspberry Pi Pico 2 W',
     // Raspberry Pi Pico MicroPython (Same for all Raspberry Pi Pico models)
     'USB\\VID_2E8A&PID_0005': 'Raspberry Pi Pico MicroPython',
+    // MicroPython pyboard (VID F055 is MicroPython's own)
+    'USB\\VID_F055&PID_9800': 'MicroPython pyboard',
+    'USB\\VID_F055&PID_9801': 'MicroPython pyboard',
+    'USB\\VID_F055&PID_9802': 'MicroPython pyboard',
     // Makey Makey
     'USB\\VID_1B4F&PID_2B74': 'Makey Makey',
     'USB\\VID_1B4F&PID_2B75': 'Makey Makey'
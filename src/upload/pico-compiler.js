@@ -3,6 +3,8 @@ const path = require('path');
 const {spawn, spawnSync} = require('child_process');
 const ansi = require('ansi-string');
 
+const {tryBridgeDaemon} = require('../lib/bridge-daemon');
+
 /**
  * Simplified compiler for Raspberry Pi Pico W
  * Supports multiple compilation methods including PicoLib
@@ -313,6 +315,24 @@ def delay(ms):
             try {
                 this._sendstd(`${ansi.green_dark}Uploading to Pico W via MicroPython...\n`);
                 
+                // Reuse the persistent bridge daemon if it is running (no process spawn, no reconnect).
+                // Once the daemon answers (or is busy) it owns the port: never fall through to the
+                // cleanup below, which would kill it
+                let response;
+                try {
+                    const codeContent = fs.readFileSync(this._codePath, 'utf8');
+                    response = await tryBridgeDaemon({command: 'execute_code', code: codeContent});
+                } catch (error) {
+                    this._sendstd(`${ansi.red_dark}❌ Bridge daemon error: ${error.message}\n`);
+                    return reject(error);
+                }
+                // null: daemon not running, fall back to spawning pico_bridge.py
+                if (response) {
+                    if (response.result) this._sendstd(response.result);
+                    this._sendstd(`${ansi.green_dark}✅ Código ejecutándose en Pico W (daemon)!\n`);
+                    return resolve('Success');
+                }
+                
                 // AGGRESSIVE PORT CLEANUP
                 this._sendstd(`${ansi.yellow_dark}🧹 Limpiando puertos agresivamente...\n`);
                 await this.aggressivePortCleanup();